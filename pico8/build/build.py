@@ -8,6 +8,9 @@ from ..lua import parser
 from ..lua import lexer
 
 
+# The filename suffixes of cart files.
+_CART_SUFFIXES = ('.p8', '.p8.png')
+
 # The default Lua load path if neither PICO8_LUA_PATH nor --lua-path are set.
 DEFAULT_LUA_PATH = '?;?.lua'
 
@@ -224,8 +227,7 @@ def do_build(args):
     Args:
         args: The argparse.Namespace arguments object.
     """
-    if (not args.filename.endswith('.p8') and
-            not args.filename.endswith('.p8.png')):
+    if not args.filename.endswith(_CART_SUFFIXES):
         util.error('Output filename must end with .p8 or .p8.png.')
         return 1
 
@@ -253,15 +255,14 @@ def do_build(args):
                 util.error('File "%s" given for --%s arg does not exist.' %
                            (fn, section))
                 return 1
-            if (not fn.endswith('.p8') and
-                    not fn.endswith('.p8.png') and
-                    not (section == 'lua' and fn.endswith('.lua'))):
+            is_lua_source = section == 'lua' and fn.endswith('.lua')
+            if not fn.endswith(_CART_SUFFIXES) and not is_lua_source:
                 util.error(
                     'Unsupported file type for --%s arg.' % (section,))
                 return 1
 
             # Load section from source and store it in the result.
-            if section == 'lua' and fn.endswith('.lua'):
+            if is_lua_source:
                 with open(fn, 'rb') as infh:
                     result.lua = lua.Lua.from_lines(
                         infh, version=game.DEFAULT_VERSION)
@@ -23,7 +23,6 @@ haven't found yet.
 __all__ = ['main']
 
 import argparse
-import tempfile
 import textwrap
 
 from .. import util
@@ -33,7 +32,19 @@ from ..lua import lua
 from ..lua import parser
 
 
+# The argument parser, built by the first call to _get_argparser().
+_argparser = None
+
+
 def _get_argparser():
+    """Returns the argument parser, building it on first use."""
+    global _argparser
+    if _argparser is None:
+        _argparser = _build_argparser()
+    return _argparser
+
+
+def _build_argparser():
     """Builds and returns the argument parser."""
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -362,11 +373,7 @@ def main(orig_args=None):
     g.lua.reparse(writer_cls=lua.LuaASTEchoWriter,
                   writer_args={'ignore_tokens': True})
 
-    with tempfile.TemporaryFile(mode='w+', encoding='utf-8') as outfh:
-        g.to_p8_file(outfh, filename=out_fname,
-                     lua_writer_cls=lua.LuaMinifyTokenWriter)
-        outfh.seek(0)
-        with open(out_fname, 'w', encoding='utf-8') as finalfh:
-            finalfh.write(outfh.read())
+    file.to_file(g, filename=out_fname,
+                 lua_writer_cls=lua.LuaMinifyTokenWriter)
 
     return 0
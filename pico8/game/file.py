@@ -6,7 +6,9 @@ __all__ = [
 ]
 
 import collections
+import io
 import os
+import stat
 import tempfile
 
 from .. import util
@@ -16,6 +18,14 @@ from .formatter.p8png import P8PNGFormatter
 from .formatter.rom import ROMFormatter
 
 
+# The output buffer size for to_file().
+_WRITE_BUFFER_SIZE = 1 << 16
+
+# The input buffer size for from_file(). This is larger than any cart file,
+# so a cart is read with one system call instead of one per 8 KiB.
+_READ_BUFFER_SIZE = 1 << 20
+
+
 Formatter = collections.namedtuple('Formatter', ('extension', 'cls'))
 FORMATTERS = (
     Formatter('.p8.png', P8PNGFormatter),
@@ -49,12 +59,37 @@ def formatter_for_filename(filename):
     raise UnrecognizedFileType(filename)
 
 
-def from_file(filename):
+def from_file(filename, parse=True):
     """Loads a game from a named file.
 
     Args:
         filename: The name of the file. Must end in either ".p8" or
         ".p8.png".
+        parse: If False, the Lua code is lexed but not parsed, and the
+        game's lua.root is None.
+
+    Returns:
+        A Game containing the game data.
+
+    Raises:
+        lexer.LexerError
+        parser.ParserError
+        InvalidP8HeaderError
+    """
+    fmt = formatter_for_filename(filename=filename)
+    with open(filename, 'rb', buffering=_READ_BUFFER_SIZE) as fh:
+        return fmt.from_file(fh, filename=filename, parse=parse)
+
+
+def from_bytes(data, filename, parse=True):
+    """Loads a game from the contents of a named file.
+
+    Args:
+        data: The file contents, as a bytestring.
+        filename: The name of the file. Must end in either ".p8" or
+        ".p8.png".
+        parse: If False, the Lua code is lexed but not parsed, and the
+        game's lua.root is None.
 
     Returns:
         A Game containing the game data.
@@ -65,8 +100,7 @@ def from_file(filename):
         InvalidP8HeaderError
     """
     fmt = formatter_for_filename(filename=filename)
-    with open(filename, 'rb') as fh:
-        return fmt.from_file(fh, filename=filename)
+    return fmt.from_file(io.BytesIO(data), filename=filename, parse=parse)
 
 
 def to_file(game, filename, *args, **kwargs):
@@ -82,12 +116,34 @@ def to_file(game, filename, *args, **kwargs):
         filename: The filename.
     """
     fmt = formatter_for_filename(filename=filename)
-    file_args = {'mode': 'wb+'}
-    with tempfile.TemporaryFile(**file_args) as outfh:
-        if kwargs.get('label_fname', None) is None:
-            if os.path.exists(filename):
-                kwargs['label_fname'] = filename
-        fmt.to_file(game, outfh, filename=filename, *args, **kwargs)
-        outfh.seek(0)
-        with open(filename, **file_args) as finalfh:
-            finalfh.write(outfh.read())
+    if kwargs.get('label_fname', None) is None:
+        if os.path.exists(filename):
+            kwargs['label_fname'] = filename
+
+    # Write directly to a temp file beside the target and move it into place,
+    # so a failed write never leaves a truncated cart behind. (A symlinked
+    # cart is written through the link, and an existing cart keeps its
+    # permissions.)
+    target = os.path.realpath(filename)
+    try:
+        mode = stat.S_IMODE(os.stat(target).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_get_umask()
+    fd, tmp_filename = tempfile.mkstemp(
+        dir=os.path.dirname(target) or '.', suffix='.tmp')
+    try:
+        with open(fd, 'wb', buffering=_WRITE_BUFFER_SIZE) as outfh:
+            fmt.to_file(game, outfh, filename=filename, *args, **kwargs)
+        os.chmod(tmp_filename, mode)
+        os.replace(tmp_filename, target)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.unlink(tmp_filename)
+        raise
+
+
+def _get_umask():
+    """Gets the process umask, which os can only read by setting it."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
@@ -195,9 +195,12 @@ def process_includes(lualines, filename=None):
             p8_fmt_cls = (
                 P8Formatter if inc_extension == '.p8'
                 else P8PNGFormatter)
+            # (Only the included cart's lines are needed. They are parsed
+            # again as part of the including cart.)
             with open(inc_full_path, 'rb') as fh:
                 inc_game = p8_fmt_cls.from_file(
-                    fh, filename=inc_full_path, do_includes=False)
+                    fh, filename=inc_full_path, do_includes=False,
+                    parse=False)
                 for line in lines_for_tab(inc_game.lua.to_lines(), inc_tab):
                     yield line
         else:
@@ -209,13 +212,15 @@ def process_includes(lualines, filename=None):
 class P8Formatter(BaseFormatter):
     @classmethod
     def from_file(
-            cls, instr, filename=None, do_includes=True, *args, **kwargs):
+            cls, instr, filename=None, do_includes=True, parse=True,
+            *args, **kwargs):
         """Reads a game from a .p8.png file.
 
         Args:
           instr: The input stream.
           filename: The filename, if any, for tool messages.
           do_includes: If True, process #include directives.
+          parse: If False, the Lua code is lexed but not parsed.
 
         Returns:
           A Game containing the game data.
@@ -235,7 +240,7 @@ class P8Formatter(BaseFormatter):
                 if do_includes:
                     lualines = process_includes(lualines, filename)
                 new_game.lua = lua.Lua.from_lines(
-                    lualines, version=data.version)
+                    lualines, version=data.version, parse=parse)
             elif section == 'gfx':
                 new_game.gfx = Gfx.from_lines(
                     data.section_lines[section], version=data.version)
@@ -283,34 +288,32 @@ class P8Formatter(BaseFormatter):
 
         outstr.write(bytes('version %s\n' % game.version, 'utf-8'))
 
+        # (The writer's lines are generated once, for both the sanity check
+        # and the output.)
+        lua_lines = list(game.lua.to_lines(
+            writer_cls=lua_writer_cls, writer_args=lua_writer_args))
+
         # Sanity-check the Lua written by the writer.
         transformed_lua = lua.Lua.from_lines(
-            game.lua.to_lines(writer_cls=lua_writer_cls,
-                              writer_args=lua_writer_args),
-            version=(game.version or 0))
-        if transformed_lua.get_char_count() > lua.PICO8_LUA_CHAR_LIMIT:
+            lua_lines, version=(game.version or 0))
+        char_count, token_count, _ = transformed_lua.get_counts()
+        if char_count > lua.PICO8_LUA_CHAR_LIMIT:
             if filename is not None:
                 util.error('{}: '.format(filename))
             util.error('warning: character count {} exceeds the PICO-8 '
                        'limit of {}\n'.format(
-                           transformed_lua.get_char_count(),
-                           lua.PICO8_LUA_CHAR_LIMIT))
-        if transformed_lua.get_token_count() > lua.PICO8_LUA_TOKEN_LIMIT:
+                           char_count, lua.PICO8_LUA_CHAR_LIMIT))
+        if token_count > lua.PICO8_LUA_TOKEN_LIMIT:
             if filename is not None:
                 util.error('{}: '.format(filename))
             util.error('warning: token count {} exceeds the PICO-8 '
                        'limit of {}\n'.format(
-                           transformed_lua.get_token_count(),
-                           lua.PICO8_LUA_TOKEN_LIMIT))
+                           token_count, lua.PICO8_LUA_TOKEN_LIMIT))
 
         outstr.write(b'__lua__\n')
-        ended_in_newline = None
-        for line in game.lua.to_lines(
-                writer_cls=lua_writer_cls,
-                writer_args=lua_writer_args):
-            outstr.write(bytes(lua.p8scii_to_unicode(line), 'utf-8'))
-            ended_in_newline = line.endswith(b'\n')
-        if not ended_in_newline:
+        outstr.write(bytes(lua.p8scii_to_unicode(b''.join(lua_lines)),
+                           'utf-8'))
+        if not lua_lines or not lua_lines[-1].endswith(b'\n'):
             outstr.write(b'\n')
 
         outstr.write(b'__gfx__\n')
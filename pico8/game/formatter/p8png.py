@@ -28,6 +28,13 @@ class InvalidP8PNGError(util.InvalidP8DataError):
     pass
 
 
+# For each PNG color plane, the plane index and a table that moves the two
+# low bits of a channel value to their position in a PICO-8 byte.
+_PLANE_BIT_TABLES = tuple(
+    (plane, bytes((value & 3) << shift for value in range(256)))
+    for plane, shift in ((2, 0), (1, 2), (0, 4), (3, 6)))
+
+
 def get_picodata_from_pngdata(width, height, pngdata, attrs):
     """Extracts PICO-8 bytes from a .p8.png's PNG data.
 
@@ -44,22 +51,26 @@ def get_picodata_from_pngdata(width, height, pngdata, attrs):
     Returns:
         The PICO-8 data, a list of width * height (0x8000) byte-size numbers.
     """
-    picodata = [0] * width * height
-
-    row_i = 0
+    planes = attrs['planes']
+    # (Rows are copied straight into one preallocated buffer, instead of
+    # copying each row to bytes and then joining the copies.)
+    pixels = bytearray(width * height * planes)
+    offset = 0
     for row in pngdata:
-        for col_i in range(width):
-            picodata[row_i * width + col_i] |= (
-                (row[col_i * attrs['planes'] + 2] & 3) << (0 * 2))
-            picodata[row_i * width + col_i] |= (
-                (row[col_i * attrs['planes'] + 1] & 3) << (1 * 2))
-            picodata[row_i * width + col_i] |= (
-                (row[col_i * attrs['planes'] + 0] & 3) << (2 * 2))
-            picodata[row_i * width + col_i] |= (
-                (row[col_i * attrs['planes'] + 3] & 3) << (3 * 2))
-        row_i += 1
+        end = offset + len(row)
+        pixels[offset:end] = row
+        offset = end
+
+    # Each channel's two low bits are masked and shifted into place with a
+    # translate table, then the four channels are combined as one big
+    # integer. The bit fields do not overlap, so OR-ing the integers packs
+    # every byte at once.
+    picobytes = 0
+    for plane, table in _PLANE_BIT_TABLES:
+        picobytes |= int.from_bytes(
+            pixels[plane::planes].translate(table), 'big')
 
-    return picodata
+    return list(picobytes.to_bytes(width * height, 'big'))
 
 
 def get_pngdata_from_picodata(picodata, pngdata, attrs):
@@ -209,12 +220,13 @@ def get_raw_data_from_p8png_file(instr, filename=None):
 
 class P8PNGFormatter(BaseFormatter):
     @classmethod
-    def from_file(cls, instr, filename=None, *args, **kwargs):
+    def from_file(cls, instr, filename=None, parse=True, *args, **kwargs):
         """Reads a game from a .p8.png file.
 
         Args:
           instr: The input stream.
           filename: The filename, if any, for tool messages.
+          parse: If False, the Lua code is lexed but not parsed.
 
         Returns:
           A Game containing the game data.
@@ -225,7 +237,7 @@ class P8PNGFormatter(BaseFormatter):
             filename=filename, compressed_size=data.compressed_size)
         new_game.version = data.version
         new_game.lua = Lua.from_lines(
-            [data.code], version=data.version)
+            [data.code], version=data.version, parse=parse)
         new_game.gfx = Gfx.from_bytes(
             data.gfx, version=data.version)
         new_game.gff = Gff.from_bytes(
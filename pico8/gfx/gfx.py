@@ -30,6 +30,8 @@ __all__ = [
   'TRANSPARENT'
 ]
 
+import binascii
+
 from .. import util
 
 
@@ -56,6 +58,17 @@ PEACH = 15
 TRANSPARENT = 16
 
 
+# The whitespace characters deleted from .p8 hex lines before decoding.
+_WHITESPACE = b' \t\r\n'
+
+# Translate tables that extract the low or high nibble of a byte.
+_LOW_NIBBLES = bytes(b & 0x0f for b in range(256))
+_HIGH_NIBBLES = bytes(b >> 4 for b in range(256))
+
+# A translate table that swaps the high and low nibbles of a byte.
+_SWAP_NIBBLES = bytes((b >> 4) | ((b & 0xf) << 4) for b in range(256))
+
+
 class Gfx(util.BaseSection):
     """The sprite graphics section for a PICO-8 cart."""
     HEX_LINE_LENGTH_BYTES = 64
@@ -82,19 +95,13 @@ class Gfx(util.BaseSection):
         Returns:
           A Gfx instance.
         """
-        datastrs = []
-        for line in lines:
-            if len(line) != 129:
-                continue
-
-            larray = list(line.rstrip())
-            for i in range(0, 128, 2):
-                (larray[i], larray[i+1]) = (larray[i+1], larray[i])
-
-            larray_str = str(bytes(larray), encoding='ascii')
-            datastrs.append(bytearray.fromhex(larray_str))
-
-        data = b''.join(datastrs)
+        # (The .p8 digits of each byte are in pixel order, low nibble first.
+        # The whole section is decoded at once, then the nibbles of every
+        # byte are swapped.)
+        hexstr = b''.join(line for line in lines if len(line) == 129)
+        data = binascii.unhexlify(
+            hexstr.translate(None, _WHITESPACE)).translate(
+                _SWAP_NIBBLES)
         return cls(data=data, version=version)
 
     def to_lines(self):
@@ -106,15 +113,10 @@ class Gfx(util.BaseSection):
         Yields:
           One line of a hex string.
         """
-        for start_i in range(0, len(self._data), self.HEX_LINE_LENGTH_BYTES):
-            end_i = start_i + self.HEX_LINE_LENGTH_BYTES
-            newdata = []
-            for b in self._data[start_i:end_i]:
-                newdata.append((b & 0x0f) << 4 | (b & 0xf0) >> 4)
-
-            yield (
-              bytes(util.bytes_to_hex(bytes(newdata)), encoding='ascii') +
-              b'\n')
+        hexdata = binascii.hexlify(self._data.translate(_SWAP_NIBBLES))
+        line_len = self.HEX_LINE_LENGTH_BYTES * 2
+        for start_i in range(0, len(hexdata), line_len):
+            yield hexdata[start_i:start_i + line_len] + b'\n'
 
     def get_sprite(self, id, tile_width=1, tile_height=1):
         """Retrieves the graphics data for a sprite.
@@ -154,24 +156,21 @@ class Gfx(util.BaseSection):
         assert 1 <= tile_height
         first_tile_row = id // 16
         first_tile_col = id % 16
+        # (The sprite's tiles that are on the spritesheet are adjacent in
+        # memory, 4 bytes per tile in each pixel row. Each row's bytes are
+        # split into low and high nibbles, which are the left and right
+        # pixels.)
+        sheet_width = (min(16, first_tile_col + tile_width) -
+                       first_tile_col) * 8
         result = []
         for ty in range(first_tile_row, first_tile_row + tile_height):
             for y_offset in range(8):
-                row = bytearray()
-                for tx in range(first_tile_col, first_tile_col + tile_width):
-                    if tx > 15 or ty > 15:
-                        row.extend([0] * 8)
-                    else:
-                        for x_offset in range(8):
-                            data_loc = (ty * 64 * 8 +
-                                        y_offset * 64 +
-                                        tx * 4 +
-                                        x_offset // 2)
-                            b = self._data[data_loc]
-                            if x_offset % 2 == 0:
-                                row.append(b & 0x0f)
-                            else:
-                                row.append((b & 0xf0) >> 4)
+                row = bytearray(tile_width * 8)
+                if ty <= 15:
+                    start = ty * 64 * 8 + y_offset * 64 + first_tile_col * 4
+                    row_bytes = self._data[start:start + sheet_width // 2]
+                    row[0:sheet_width:2] = row_bytes.translate(_LOW_NIBBLES)
+                    row[1:sheet_width:2] = row_bytes.translate(_HIGH_NIBBLES)
                 result.append(row)
         return result
 
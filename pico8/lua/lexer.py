@@ -1,6 +1,7 @@
 """The Lua lexer."""
 
 import re
+from typing import Dict
 
 from .. import util
 
@@ -18,7 +19,8 @@ __all__ = [
     'TokKeyword',
     'TokSymbol',
     'Lexer',
-    'LUA_KEYWORDS'
+    'LUA_KEYWORDS',
+    'SPACE_TOKEN_TYPES'
 ]
 
 LUA_KEYWORDS = {
@@ -75,11 +77,9 @@ class Token():
         Args:
           other: The other Token to compare.
         """
-        if (type(self) != type(other) or
-                not isinstance(self, other.__class__)):
+        if type(self) is not type(other):
             return False
-        if (isinstance(self, TokKeyword) and
-                isinstance(other, TokKeyword)):
+        if isinstance(self, TokKeyword):
             return self._data.lower() == other._data.lower()
         return self._data == other._data
 
@@ -93,6 +93,8 @@ class Token():
         Args:
           other: The other Token to compare.
         """
+        if self is other:
+            return True
         if isinstance(other, type):
             return isinstance(self, other)
 
@@ -223,14 +225,52 @@ class TokLabel(Token):
     name = 'label'
 
 
+def _new_pattern_token(cls, data, lineno, charno):
+    """Creates a token, reusing one instance per value for patterns.
+
+    The parser builds a TokKeyword or TokSymbol with no position every time
+    it tests the next token against a pattern. These pattern tokens are
+    cached by value so each is only allocated once.
+
+    Args:
+      cls: The Token class.
+      data: The code data for the token.
+      lineno: The source file line number of the first character.
+      charno: The character number on the line of the first character.
+
+    Returns:
+      A new token, or the cached pattern token if there is no position.
+    """
+    if data is None or lineno is not None or charno is not None:
+        return object.__new__(cls)
+    token = cls._patterns.get(data)
+    if token is None:
+        token = cls._patterns[data] = object.__new__(cls)
+    return token
+
+
 class TokKeyword(Token):
     """A Lua keyword."""
     name = 'keyword'
+    _patterns: Dict[bytes, 'TokKeyword'] = {}
+
+    def __new__(cls, data=None, lineno=None, charno=None):
+        return _new_pattern_token(cls, data, lineno, charno)
 
 
 class TokSymbol(Token):
     """A Lua symbol."""
     name = 'symbol'
+    _patterns: Dict[bytes, 'TokSymbol'] = {}
+
+    def __new__(cls, data=None, lineno=None, charno=None):
+        return _new_pattern_token(cls, data, lineno, charno)
+
+
+# The token classes that preserve formatting but are not part of the Lua
+# grammar. These classes are never subclassed, so callers can test membership
+# with type(token) in SPACE_TOKEN_TYPES instead of three isinstance() calls.
+SPACE_TOKEN_TYPES = frozenset((TokSpace, TokNewline, TokComment))
 
 
 # A mapping of characters that can be escaped in Lua string literals using a
@@ -251,34 +291,36 @@ _STRING_REVERSE_ESCAPES = dict((v, k) for k, v in _STRING_ESCAPES.items())
 del _STRING_REVERSE_ESCAPES[b"'"]
 del _STRING_REVERSE_ESCAPES[b'"']
 
-# A list of single-line token matching patterns and corresponding token
-# classes. A token class of None causes the lexer to consume the pattern
-# without emitting a token. The patterns are matched in order.
+# A list of single-line token matching patterns, as regular expression
+# source bytestrings, and corresponding token classes. A token class of None
+# causes the lexer to consume the pattern without emitting a token. The
+# patterns are matched in order. (They are only compiled together, as
+# _TOKEN_RE.)
 _TOKEN_MATCHERS = []
 _TOKEN_MATCHERS.extend([
-    (re.compile(br'--.*'), TokComment),
-    (re.compile(br'//.*'), TokComment),
-    (re.compile(br'[ \t]+'), TokSpace),
-    (re.compile(br'\r\n'), TokNewline),
-    (re.compile(br'\n'), TokNewline),
-    (re.compile(br'\r'), TokNewline),
-    (re.compile(br'0[xX][0-9a-fA-F]+(\.[0-9a-fA-F]+)?'), TokNumber),
-    (re.compile(br'0[xX]\.[0-9a-fA-F]+'), TokNumber),
-    (re.compile(br'0[bB][01]+(\.[01]+)?'), TokNumber),
-    (re.compile(br'0[bB]\.[01]+'), TokNumber),
-    (re.compile(br'[0-9]+(\.(?!\.)[0-9]*)?([eE]-?[0-9]+)?'), TokNumber),
-    (re.compile(br'\.[0-9]+([eE]-?[0-9]+)?'), TokNumber),
-    (re.compile(br'::[a-zA-Z_\x80-\xff][a-zA-Z0-9_\x80-\xff]*::'), TokLabel),
+    (br'--.*', TokComment),
+    (br'//.*', TokComment),
+    (br'[ \t]+', TokSpace),
+    (br'\r\n', TokNewline),
+    (br'\n', TokNewline),
+    (br'\r', TokNewline),
+    (br'0[xX][0-9a-fA-F]+(\.[0-9a-fA-F]+)?', TokNumber),
+    (br'0[xX]\.[0-9a-fA-F]+', TokNumber),
+    (br'0[bB][01]+(\.[01]+)?', TokNumber),
+    (br'0[bB]\.[01]+', TokNumber),
+    (br'[0-9]+(\.(?!\.)[0-9]*)?([eE]-?[0-9]+)?', TokNumber),
+    (br'\.[0-9]+([eE]-?[0-9]+)?', TokNumber),
+    (br'::[a-zA-Z_\x80-\xff][a-zA-Z0-9_\x80-\xff]*::', TokLabel),
 ])
 _TOKEN_MATCHERS.extend([
-    (re.compile(br'\b'+keyword+br'\b'), TokKeyword)
+    (br'\b'+keyword+br'\b', TokKeyword)
     for keyword in LUA_KEYWORDS])
 # REMINDER: token patterns are ordered! The lexer stops at the first matching
 # pattern. This is especially tricky for the symbols because you have to make
 # sure symbols like >>> appear before >>. (If >> appeared first in this list,
 # >>> would never match.)
 _TOKEN_MATCHERS.extend([
-    (re.compile(symbol), TokSymbol) for symbol in [
+    (symbol, TokSymbol) for symbol in [
         br'\+=', b'-=', br'\*=', b'/=', b'%=', br'\.\.=',
         b'==', b'~=', b'!=', b'<=', b'>=',
         b'&', br'\|', br'\^\^', b'~', b'<<>', b'>>>', b'>><', b'<<', b'>>',
@@ -289,10 +331,25 @@ _TOKEN_MATCHERS.extend([
         br'\(', br'\)', b'{', b'}', br'\[', br'\]', b';', b':', b',',
         br'\.\.\.', br'\.\.', br'\.']])
 _TOKEN_MATCHERS.extend([
-    (re.compile(br'[a-zA-Z_\x80-\xff][a-zA-Z0-9_\x80-\xff]*'), TokName),
-    (re.compile(br'\?'), TokName)
+    (br'[a-zA-Z_\x80-\xff][a-zA-Z0-9_\x80-\xff]*', TokName),
+    (br'\?', TokName)
 ])
 
+# All of the single-line token patterns as one regular expression, so one
+# match() call finds the next token. Alternatives are tried in order, so the
+# first matching pattern wins, as it does in _TOKEN_MATCHERS. Each pattern is
+# a named group; the name of the outermost matching group is the key into
+# _TOKEN_CLASSES.
+_TOKEN_RE = re.compile(b'|'.join(
+    b'(?P<t' + str(i).encode() + b'>' + pat + b')'
+    for i, (pat, _) in enumerate(_TOKEN_MATCHERS)))
+_TOKEN_CLASSES = dict(
+    ('t' + str(i), tok_class)
+    for i, (_, tok_class) in enumerate(_TOKEN_MATCHERS))
+
+_MULTILINE_STRING_START_RE = re.compile(br'\[(=*)\[')
+_STRING_ESCAPE_NUMBER_RE = re.compile(br'\d{1,3}')
+
 
 class Lexer():
     """The lexer.
@@ -378,7 +435,7 @@ class Lexer():
 
                 if c == b'\\':
                     # Escape character.
-                    num_m = re.match(br'\d{1,3}', s[i+1:])
+                    num_m = _STRING_ESCAPE_NUMBER_RE.match(s, i + 1)
                     if num_m:
                         c = bytes([int(num_m.group(0))])
                         i += len(num_m.group(0))
@@ -434,8 +491,9 @@ class Lexer():
             self._in_multiline_comment_charno = self._cur_charno
             i = 4
 
-        elif re.match(br'\[=*\[', s):
-            m = re.match(br'\[(=*)\[', s)
+        elif (s.startswith(b'[') and
+              _MULTILINE_STRING_START_RE.match(s) is not None):
+            m = _MULTILINE_STRING_START_RE.match(s)
             i = m.end()
             self._in_multiline_string = []
             self._in_multiline_string_delim = m.group(1)
@@ -452,24 +510,22 @@ class Lexer():
 
         else:
             # Match one-line patterns.
-            for (pat, tok_class) in _TOKEN_MATCHERS:
-                m = pat.match(s)
-                if m:
-                    if tok_class is not None:
-                        token = tok_class(m.group(0),
-                                          self._cur_lineno,
-                                          self._cur_charno)
-                        self._tokens.append(token)
-                    i = len(m.group(0))
-                    break
+            m = _TOKEN_RE.match(s)
+            if m:
+                tok_class = _TOKEN_CLASSES[m.lastgroup]
+                if tok_class is not None:
+                    token = tok_class(m.group(0),
+                                      self._cur_lineno,
+                                      self._cur_charno)
+                    self._tokens.append(token)
+                i = m.end()
 
-        for c in s[:i]:
-            # (b'\n'[0] == 10)
-            if c == b'\n'[0]:
-                self._cur_lineno += 1
-                self._cur_charno = 0
-            else:
-                self._cur_charno += 1
+        newlines = s.count(b'\n', 0, i)
+        if newlines:
+            self._cur_lineno += newlines
+            self._cur_charno = i - s.rindex(b'\n', 0, i) - 1
+        else:
+            self._cur_charno += i
         return i
 
     def _process_line(self, line):
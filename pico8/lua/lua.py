@@ -8,6 +8,7 @@ __all__ = [
     'PICO8_BUILTINS',
     'P8SCII_CHARSET',
     'P8Char',
+    'LuaStats',
     'unicode_to_p8scii',
     'p8scii_to_unicode'
 ]
@@ -105,6 +106,11 @@ PICO8_BUILTINS = {
 
 P8Char = collections.namedtuple('P8Char', ('p8scii', 'p8string', 'name'))
 
+# Statistics about a cart's code, as returned by Lua.get_stats().
+LuaStats = collections.namedtuple(
+    'LuaStats', ('title', 'byline', 'version', 'char_count', 'token_count',
+                 'line_count'))
+
 
 # The P8SCII character set
 P8SCII_CHARSET = [
@@ -293,6 +299,17 @@ P8SCII_CHARSET = [
 UNICODE_TO_P8SCII = dict((c.p8string, c.p8scii) for c in P8SCII_CHARSET)
 UNICODE_CHAR_WIDTHS = dict((k[0], len(k)) for k in UNICODE_TO_P8SCII.keys())
 
+# str.translate() table from Latin-1 decoded P8SCII to Unicode strings.
+_P8SCII_TO_UNICODE_TABLE = [c.p8string for c in P8SCII_CHARSET]
+
+# str.translate() table from Unicode to P8SCII codes as Latin-1 characters.
+# Code points below 256 that are not P8SCII characters map to U+FFFF so that
+# encoding the result fails. The two-character glyphs are not in the table.
+_UNICODE_TO_P8SCII_TABLE = dict.fromkeys(range(256), '\uffff')
+_UNICODE_TO_P8SCII_TABLE.update(
+    (ord(c.p8string), chr(c.p8scii)) for c in P8SCII_CHARSET
+    if len(c.p8string) == 1)
+
 
 def unicode_to_p8scii(s):
     """Convert a Unicode string to P8SCII.
@@ -303,6 +320,12 @@ def unicode_to_p8scii(s):
     Returns:
         A bytestring of P8SCII codes.
     """
+    try:
+        return s.translate(_UNICODE_TO_P8SCII_TABLE).encode('latin-1')
+    except UnicodeEncodeError:
+        # (The string has a two-character glyph, or a character that is not
+        # in P8SCII, so convert it one character at a time.)
+        pass
     result = []
     idx = 0
     while idx < len(s):
@@ -321,7 +344,12 @@ def p8scii_to_unicode(bs):
     Returns:
         A Unicode string.
     """
-    return ''.join(P8SCII_CHARSET[b].p8string for b in bs)
+    return str(bs, encoding='latin-1').translate(_P8SCII_TO_UNICODE_TABLE)
+
+
+# The symbols and keywords that PICO-8 does not count toward the token limit.
+_UNCOUNTED_SYMBOLS = frozenset((b':', b'.', b')', b']', b'}'))
+_UNCOUNTED_KEYWORDS = frozenset((b'local', b'end'))
 
 
 class Lua():
@@ -340,36 +368,52 @@ class Lua():
         self._parser = parser.Parser(version=version)
 
     def get_char_count(self):
-        return sum(len(line) for line in self.to_lines())
+        return self.get_counts()[0]
 
     def get_token_count(self):
-        c = 0
-        for t in self._lexer._tokens:
-            # TODO: As of 0.1.8, "1 .. 5" is three tokens, "1..5" is one token
-            if (t.matches(lexer.TokSymbol(b':')) or
-                    t.matches(lexer.TokSymbol(b'.')) or
-                    t.matches(lexer.TokSymbol(b')')) or
-                    t.matches(lexer.TokSymbol(b']')) or
-                    t.matches(lexer.TokSymbol(b'}')) or
-                    t.matches(lexer.TokKeyword(b'local')) or
-                    t.matches(lexer.TokKeyword(b'end'))):
-                # PICO-8 generously does not count these as tokens.
-                pass
-            elif t.matches(lexer.TokNumber) and t._data.find(b'e') != -1:
-                # PICO-8 counts 'e' part of number as a separate token.
-                c += 2
-            elif (not isinstance(t, lexer.TokSpace) and
-                  not isinstance(t, lexer.TokNewline) and
-                  not isinstance(t, lexer.TokComment)):
-                c += 1
-        return c
+        return self.get_counts()[1]
 
     def get_line_count(self):
-        c = 0
+        return self.get_counts()[2]
+
+    def get_counts(self):
+        """Counts the characters, tokens, and lines in one pass.
+
+        get_char_count(), get_token_count(), and get_line_count() each return
+        one field of this result.
+
+        Returns:
+          A tuple: (char_count, token_count, line_count).
+        """
+        char_count = 0
+        token_count = 0
+        line_count = 0
+        # (Token classes are never subclassed, so type identity is enough.)
+        tok_symbol = lexer.TokSymbol
+        tok_keyword = lexer.TokKeyword
+        tok_number = lexer.TokNumber
+        tok_newline = lexer.TokNewline
+        space_types = lexer.SPACE_TOKEN_TYPES
         for t in self._lexer._tokens:
-            if isinstance(t, lexer.TokNewline):
-                c += 1
-        return c
+            char_count += len(t.code)
+            t_type = type(t)
+            # TODO: As of 0.1.8, "1 .. 5" is three tokens, "1..5" is one token
+            if t_type is tok_symbol:
+                # PICO-8 generously does not count some symbols as tokens.
+                if t._data not in _UNCOUNTED_SYMBOLS:
+                    token_count += 1
+            elif t_type is tok_keyword:
+                # ... or some keywords.
+                if t._data.lower() not in _UNCOUNTED_KEYWORDS:
+                    token_count += 1
+            elif t_type is tok_number and b'e' in t._data:
+                # PICO-8 counts 'e' part of number as a separate token.
+                token_count += 2
+            elif t_type is tok_newline:
+                line_count += 1
+            elif t_type not in space_types:
+                token_count += 1
+        return char_count, token_count, line_count
 
     def get_title(self):
         if len(self._lexer.tokens) < 1:
@@ -387,6 +431,18 @@ class Lua():
             return None
         return title_tok.value[2:].strip()
 
+    def get_stats(self):
+        """Gets the title, byline, version, and counts of the code.
+
+        The counts are computed in one pass, as with get_counts().
+
+        Returns:
+          A LuaStats.
+        """
+        char_count, token_count, line_count = self.get_counts()
+        return LuaStats(self.get_title(), self.get_byline(), self._version,
+                        char_count, token_count, line_count)
+
     @property
     def tokens(self):
         return self._lexer.tokens
@@ -400,28 +456,32 @@ class Lua():
         return self._version
 
     @classmethod
-    def from_lines(cls, lines, version):
+    def from_lines(cls, lines, version, parse=True):
         """Produces a Lua data object from lines of Lua source.
 
         Args:
           lines: The Lua source, as an iterable of bytestrings.
           version: The PICO-8 data version from the game file header.
+          parse: If False, only lex the source. The result has tokens but
+            its root is None, so only token-based writers can be used.
 
         Returns:
           A populated Lua instance.
         """
         result = Lua(version)
-        result.update_from_lines(lines)
+        result.update_from_lines(lines, parse=parse)
         return result
 
-    def update_from_lines(self, lines):
+    def update_from_lines(self, lines, parse=True):
         """Updates the parser data with new lines of Lua source.
 
         Args:
           lines: The Lua source, as an iterable of P8SCII bytestrings.
+          parse: If False, only lex the source and leave the root unset.
         """
         self._lexer.process_lines(lines)
-        self._parser.process_tokens(self._lexer.tokens)
+        if parse:
+            self._parser.process_tokens(self._lexer.tokens)
 
     def to_lines(self, writer_cls=None, writer_args=None):
         """Generates lines of Lua source based on the parser output.
@@ -478,6 +538,10 @@ class BaseASTWalker():
         self._root = root
         self._args = args or {}
 
+        # The node handlers, indexed by node._kind.
+        self._node_handlers = [getattr(self, '_walk_' + cls._name)
+                               for cls in parser._NODE_TYPES]
+
     def _walk_token(self, token):
         """Walk a field whose value is a token.
 
@@ -507,7 +571,7 @@ class BaseASTWalker():
           Items returned or yielded by the handler.
         """
         if isinstance(node, parser.Node):
-            result = getattr(self, '_walk_' + node.__class__.__name__)(node)
+            result = self._node_handlers[node._kind](node)
             if result is not None:
                 for t in result:
                     yield t
@@ -745,15 +809,25 @@ class LuaASTEchoWriter(BaseLuaWriter):
         if self._args.get('ignore_tokens'):
             return b'\n'
 
-        strs = []
-        while (((node is None and self._pos < len(self._tokens)) or
-                (node is not None and self._pos < node.end_pos)) and
-               (isinstance(self._tokens[self._pos], lexer.TokSpace) or
-                isinstance(self._tokens[self._pos], lexer.TokNewline) or
-                isinstance(self._tokens[self._pos], lexer.TokComment))):
-            strs.append(self._tokens[self._pos].code)
-            self._pos += 1
-        return b''.join(strs)
+        start_pos = self._pos
+        self._skip_spaces(node)
+        return b''.join(t.code for t in self._tokens[start_pos:self._pos])
+
+    def _skip_spaces(self, node):
+        """Advances the token position past space and comment tokens.
+
+        Args:
+          node: The Node with possible space and comment tokens in its range,
+            or None to skip spaces from the current token position to the end
+            of the token stream.
+        """
+        tokens = self._tokens
+        end_pos = len(tokens) if node is None else node.end_pos
+        pos = self._pos
+        while (pos < end_pos and
+               type(tokens[pos]) in lexer.SPACE_TOKEN_TYPES):
+            pos += 1
+        self._pos = pos
 
     def _get_name(self, node, tok):
         """Gets the code for a TokName.
@@ -1367,15 +1441,9 @@ class LuaMinifyWriter(LuaASTEchoWriter):
           A string representing the minified spaces.
         """
         start_pos = self._pos
-        strs = []
-        while (((node is None and self._pos < len(self._tokens)) or
-                (node is not None and self._pos < node.end_pos)) and
-               (isinstance(self._tokens[self._pos], lexer.TokSpace) or
-                isinstance(self._tokens[self._pos], lexer.TokNewline) or
-                isinstance(self._tokens[self._pos], lexer.TokComment))):
-            if not isinstance(self._tokens[self._pos], lexer.TokComment):
-                strs.append(self._tokens[self._pos].code)
-            self._pos += 1
+        self._skip_spaces(node)
+        strs = [t.code for t in self._tokens[start_pos:self._pos]
+                if type(t) is not lexer.TokComment]
 
         if (start_pos == 0) or (self._pos == len(self._tokens)):
             # Eliminate all spaces at beginning and end of code.
@@ -1443,15 +1511,8 @@ class LuaFormatterWriter(LuaASTEchoWriter):
           A string representing the minified spaces.
         """
         start_pos = self._pos
-        strs = []
-        while (((node is None and self._pos < len(self._tokens)) or
-                (node is not None and self._pos < node.end_pos)) and
-               (isinstance(self._tokens[self._pos], lexer.TokSpace) or
-                isinstance(self._tokens[self._pos], lexer.TokNewline) or
-                isinstance(self._tokens[self._pos], lexer.TokComment))):
-            strs.append(self._tokens[self._pos].code)
-            self._pos += 1
-        spaces = b''.join(strs)
+        self._skip_spaces(node)
+        spaces = b''.join(t.code for t in self._tokens[start_pos:self._pos])
 
         # Normalize space characters.
         spaces = re.sub(br'\t', b' ', spaces)
@@ -209,7 +209,7 @@ _ast_node_types = (
     ('FieldNamedKey', ('key_name', 'exp')),
     ('FieldExp', ('exp',)),
 )
-for (name, fields) in _ast_node_types:
+for (kind, (name, fields)) in enumerate(_ast_node_types):
     def node_init(self, *args, **kwargs):
         self._start_token_pos = kwargs.get('start')
         self._end_token_pos = kwargs.get('end')
@@ -228,9 +228,14 @@ for (name, fields) in _ast_node_types:
 
     cls = type(name, (Node,), {'__init__': node_init,
                                '_name': name, '_fields': fields,
-                               '_children': None})
+                               '_kind': kind, '_children': None})
     globals()[name] = cls
 
+# The generated Node classes, indexed by their _kind. AST walkers use this to
+# build handler tables indexed by node._kind instead of looking up handlers by
+# class name for every node.
+_NODE_TYPES = tuple(globals()[name] for (name, fields) in _ast_node_types)
+
 
 # (!= is PICO-8 specific.)
 BINOP_PATS = (tuple([lexer.TokSymbol(sym) for sym in [
@@ -262,16 +267,67 @@ class Parser():
         # it and will return None for any action that would.
         self._max_pos = None
 
+        # Leaf nodes (no fields) already created during this parse, keyed by
+        # (node class, start, end). Backtracking can re-parse the same tokens,
+        # and a leaf at a given position is always the same node.
+        self._leaf_nodes = {}
+
+        # The stat parsers for stats that begin with a keyword, keyed by the
+        # keyword.
+        self._stat_keyword_fns = {
+            b'do': self._stat_do,
+            b'while': self._stat_while,
+            b'repeat': self._stat_repeat,
+            b'if': self._stat_if,
+            b'for': self._stat_for,
+            b'function': self._stat_function,
+            b'local': self._stat_local,
+            b'goto': self._stat_goto,
+        }
+
+    def _leaf(self, cls, start):
+        """Return a field-less node spanning start to the cursor.
+
+        Args:
+          cls: The Node class, one with no fields (e.g. VarargDots).
+          start: The token position where the node begins.
+
+        Returns:
+          The node, reused if one was already made for the same span.
+        """
+        key = (cls, start, self._pos)
+        node = self._leaf_nodes.get(key)
+        if node is None:
+            node = self._leaf_nodes[key] = cls(start=start, end=self._pos)
+        return node
+
     def _peek(self):
         """Return the token under the cursor.
 
         Returns:
           The token under the cursor, or None if there is no next token.
         """
-        if self._pos < len(self._tokens):
-            return self._tokens[self._pos]
+        tokens = self._tokens
+        if self._pos < len(tokens):
+            return tokens[self._pos]
         return None
 
+    def _next_code_pos(self, pos):
+        """Find the first non-space token at or after a position.
+
+        Args:
+          pos: The token position to start from.
+
+        Returns:
+          The position of the token, or len(self._tokens) if there is none.
+        """
+        tokens = self._tokens
+        num_tokens = len(tokens)
+        while (pos < num_tokens and
+               type(tokens[pos]) in lexer.SPACE_TOKEN_TYPES):
+            pos += 1
+        return pos
+
     def _accept(self, tok_pattern):
         """Match the token under the cursor, and advance the cursor if matched.
 
@@ -299,26 +355,37 @@ class Parser():
           None.
 
         """
-        start_pos = self._pos
+        tokens = self._tokens
+        num_tokens = len(tokens)
+        pos = self._pos
+        space_types = lexer.SPACE_TOKEN_TYPES
+        # (This is Token.matches() inlined, as this is the parser's most
+        # frequent call. A token can only equal a pattern of its own type.)
+        pattern_is_class = isinstance(tok_pattern, type)
+        pattern_cls = tok_pattern if pattern_is_class else type(tok_pattern)
 
         # Find the first non-space token (unless accepting a space).
-        while True:
-            cur_tok = self._peek()
-            if (cur_tok is None or
-                cur_tok.matches(tok_pattern) or
-                (not isinstance(cur_tok, lexer.TokSpace) and
-                 not isinstance(cur_tok, lexer.TokNewline) and
-                 not isinstance(cur_tok, lexer.TokComment))):
-                break
-            self._pos += 1
+        if pattern_cls in space_types:
+            while (pos < num_tokens and
+                   type(tokens[pos]) in space_types and
+                   not tokens[pos].matches(tok_pattern)):
+                pos += 1
+        else:
+            while pos < num_tokens and type(tokens[pos]) in space_types:
+                pos += 1
 
-        if (cur_tok is not None and
-            cur_tok.matches(tok_pattern) and
-                (self._max_pos is None or self._pos < self._max_pos)):
-            self._pos += 1
+        if pos >= num_tokens:
+            return None
+        cur_tok = tokens[pos]
+        if pattern_is_class:
+            matched = isinstance(cur_tok, tok_pattern)
+        else:
+            matched = cur_tok is tok_pattern or (
+                type(cur_tok) is pattern_cls and cur_tok == tok_pattern)
+        if matched and (self._max_pos is None or pos < self._max_pos):
+            self._pos = pos + 1
             return cur_tok
 
-        self._pos = start_pos
         return None
 
     def _expect(self, tok_pattern):
@@ -368,28 +435,29 @@ class Parser():
         Returns:
           Chunk(stats)
         """
+        accept = self._accept
+        parse_stat = self._stat
+        semicolon = lexer.TokSymbol(b';')
+
         pos = self._pos
         stats = []
         while True:
-            # Eat leading and intervening semicolons.
-            while self._accept(lexer.TokSymbol(b';')) is not None:
+            # Eat leading and intervening semicolons. (A failed stat leaves
+            # the cursor after these, so they are not re-eaten for laststat.)
+            while accept(semicolon) is not None:
                 pass
-            stat = self._stat()
+            stat = parse_stat()
             if stat is None:
                 break
             stats.append(stat)
 
-        # Eat leading and intervening semicolons.
-        while self._accept(lexer.TokSymbol(b';')) is not None:
-            pass
-
         laststat = self._laststat()
         if laststat is not None:
             stats.append(laststat)
 
-        # Eat trailing semicolons.
-        while self._accept(lexer.TokSymbol(b';')) is not None:
-            pass
+            # Eat trailing semicolons.
+            while accept(semicolon) is not None:
+                pass
 
         return Chunk(stats, start=pos, end=self._pos)
 
@@ -424,6 +492,28 @@ class Parser():
           StatGoto(label)
           StatLabel(label)
         """
+        tokens = self._tokens
+        tok_pos = self._next_code_pos(self._pos)
+        tok = tokens[tok_pos] if tok_pos < len(tokens) else None
+
+        # A statement that begins with a keyword or label is determined by
+        # its first token. Anything else is an assignment or function call.
+        stat_fn = None
+        if type(tok) is lexer.TokKeyword:
+            stat_fn = self._stat_keyword_fns.get(tok.value)
+        elif type(tok) is lexer.TokLabel:
+            stat_fn = self._stat_label
+        if stat_fn is None:
+            stat_fn = self._stat_assignment_or_call
+
+        pos = self._pos
+        stat = stat_fn()
+        if stat is None:
+            self._pos = pos
+        return stat
+
+    def _stat_assignment_or_call(self):
+        """Parse an assignment or function call stat."""
         pos = self._pos
 
         varlist = self._varlist()
@@ -448,153 +538,185 @@ class Parser():
         if functioncall is not None:
             return StatFunctionCall(functioncall, start=pos, end=self._pos)
         self._pos = pos
+        return None
 
-        if self._accept(lexer.TokKeyword(b'do')) is not None:
-            block = self._assert(self._chunk(), 'block in do')
-            self._expect(lexer.TokKeyword(b'end'))
-            return StatDo(block, start=pos, end=self._pos)
+    def _stat_do(self):
+        """Parse a do stat."""
+        pos = self._pos
+        if self._accept(lexer.TokKeyword(b'do')) is None:
+            return None
+        block = self._assert(self._chunk(), 'block in do')
+        self._expect(lexer.TokKeyword(b'end'))
+        return StatDo(block, start=pos, end=self._pos)
 
-        if self._accept(lexer.TokKeyword(b'while')) is not None:
-            exp = self._assert(self._exp(), 'exp in while')
-            self._expect(lexer.TokKeyword(b'do'))
-            block = self._assert(self._chunk(), 'block in while')
-            self._expect(lexer.TokKeyword(b'end'))
-            return StatWhile(exp, block, start=pos, end=self._pos)
-
-        if self._accept(lexer.TokKeyword(b'repeat')) is not None:
-            block = self._assert(self._chunk(),
-                                 'block in repeat')
-            self._expect(lexer.TokKeyword(b'until'))
-            exp = self._assert(self._exp(),
-                               'expression in repeat')
-            return StatRepeat(block, exp, start=pos, end=self._pos)
-
-        if self._accept(lexer.TokKeyword(b'if')) is not None:
-            exp_block_pairs = []
-            exp = self._exp()
+    def _stat_while(self):
+        """Parse a while stat."""
+        pos = self._pos
+        if self._accept(lexer.TokKeyword(b'while')) is None:
+            return None
+        exp = self._assert(self._exp(), 'exp in while')
+        self._expect(lexer.TokKeyword(b'do'))
+        block = self._assert(self._chunk(), 'block in while')
+        self._expect(lexer.TokKeyword(b'end'))
+        return StatWhile(exp, block, start=pos, end=self._pos)
+
+    def _stat_repeat(self):
+        """Parse a repeat stat."""
+        pos = self._pos
+        if self._accept(lexer.TokKeyword(b'repeat')) is None:
+            return None
+        block = self._assert(self._chunk(), 'block in repeat')
+        self._expect(lexer.TokKeyword(b'until'))
+        exp = self._assert(self._exp(), 'expression in repeat')
+        return StatRepeat(block, exp, start=pos, end=self._pos)
+
+    def _stat_if(self):
+        """Parse an if stat, including the PICO-8 short form."""
+        pos = self._pos
+        if self._accept(lexer.TokKeyword(b'if')) is None:
+            return None
+        exp_block_pairs = []
+        exp = self._exp()
 
-            then_pos = self._pos
-            if (self._accept(lexer.TokKeyword(b'then')) is None and
-                self._accept(lexer.TokKeyword(b'do')) is None and
-                    (self._tokens[exp._end_token_pos - 1] == lexer.TokSymbol(b')'))):
-                # Check for PICO-8 short form.
-
-                then_end_pos = exp._end_token_pos
-                while (then_end_pos < len(self._tokens) and
-                       not self._tokens[then_end_pos].matches(lexer.TokNewline)):
-                    then_end_pos += 1
-
-                try:
-                    self._max_pos = then_end_pos
-                    block = self._assert(self._chunk(),
-                                         'valid chunk in short-if')
-                    else_block = None
-                    if self._accept(lexer.TokKeyword(b'else')) is not None:
-                        # PICO-8 accepts an else with nothing after it.
-                        else_block = self._chunk()
-                finally:
-                    self._max_pos = None
-
-                # (Use exp.value here to unwrap the condition from the
-                # bracketed expression.)
-                exp_block_pairs = [(exp.value, block)]
-                if else_block is not None and len(else_block.stats) > 0:
-                    exp_block_pairs.append((None, else_block))
-                return StatIf(exp_block_pairs, start=pos, end=self._pos,
-                              short_if=True)
-
-            self._pos = then_pos
-
-            # Hack: accept "do" for "then" to support oddball carts that
-            # exploit an accidental loophole in short-if. Note that this
-            # is not how PICO-8 works: the accident comes from how PICO-8
-            # uses a preprocessing pass to convert short-if syntax to regular
-            # if syntax. The erroneous
-            #   if (cond) do
-            #     ...
-            #   end
-            # becomes
-            #   if (cond) then do end
-            #     ...
-            #   end
-            # Here, we pretend it's part of the grammar.
-            if self._accept(lexer.TokKeyword(b'do')) is None:
-                self._expect(lexer.TokKeyword(b'then'))
+        then_pos = self._pos
+        if (self._accept(lexer.TokKeyword(b'then')) is None and
+            self._accept(lexer.TokKeyword(b'do')) is None and
+                (self._tokens[exp._end_token_pos - 1] == lexer.TokSymbol(b')'))):
+            # Check for PICO-8 short form.
+
+            then_end_pos = exp._end_token_pos
+            while (then_end_pos < len(self._tokens) and
+                   not self._tokens[then_end_pos].matches(lexer.TokNewline)):
+                then_end_pos += 1
+
+            try:
+                self._max_pos = then_end_pos
+                block = self._assert(self._chunk(),
+                                     'valid chunk in short-if')
+                else_block = None
+                if self._accept(lexer.TokKeyword(b'else')) is not None:
+                    # PICO-8 accepts an else with nothing after it.
+                    else_block = self._chunk()
+            finally:
+                self._max_pos = None
+
+            # (Use exp.value here to unwrap the condition from the
+            # bracketed expression.)
+            exp_block_pairs = [(exp.value, block)]
+            if else_block is not None and len(else_block.stats) > 0:
+                exp_block_pairs.append((None, else_block))
+            return StatIf(exp_block_pairs, start=pos, end=self._pos,
+                          short_if=True)
+
+        self._pos = then_pos
+
+        # Hack: accept "do" for "then" to support oddball carts that
+        # exploit an accidental loophole in short-if. Note that this
+        # is not how PICO-8 works: the accident comes from how PICO-8
+        # uses a preprocessing pass to convert short-if syntax to regular
+        # if syntax. The erroneous
+        #   if (cond) do
+        #     ...
+        #   end
+        # becomes
+        #   if (cond) then do end
+        #     ...
+        #   end
+        # Here, we pretend it's part of the grammar.
+        if self._accept(lexer.TokKeyword(b'do')) is None:
+            self._expect(lexer.TokKeyword(b'then'))
+        block = self._chunk()
+        self._assert(block, 'Expected block in if')
+        exp_block_pairs.append((exp, block))
+        while self._accept(lexer.TokKeyword(b'elseif')) is not None:
+            exp = self._exp()
+            self._expect(lexer.TokKeyword(b'then'))
             block = self._chunk()
-            self._assert(block, 'Expected block in if')
+            self._assert(block, 'Expected block in elseif')
             exp_block_pairs.append((exp, block))
-            while self._accept(lexer.TokKeyword(b'elseif')) is not None:
-                exp = self._exp()
-                self._expect(lexer.TokKeyword(b'then'))
-                block = self._chunk()
-                self._assert(block, 'Expected block in elseif')
-                exp_block_pairs.append((exp, block))
-            if self._accept(lexer.TokKeyword(b'else')) is not None:
-                block = self._chunk()
-                self._assert(block, 'Expected block in else')
-                exp_block_pairs.append((None, block))
-            self._expect(lexer.TokKeyword(b'end'))
-            return StatIf(exp_block_pairs, start=pos, end=self._pos)
-
-        if self._accept(lexer.TokKeyword(b'for')) is not None:
-            for_pos = self._pos
+        if self._accept(lexer.TokKeyword(b'else')) is not None:
+            block = self._chunk()
+            self._assert(block, 'Expected block in else')
+            exp_block_pairs.append((None, block))
+        self._expect(lexer.TokKeyword(b'end'))
+        return StatIf(exp_block_pairs, start=pos, end=self._pos)
 
-            name = self._accept(lexer.TokName)
-            eq_sym = self._accept(lexer.TokSymbol(b'='))
-            if eq_sym is not None:
-                exp_init = self._assert(self._exp(), 'exp-init in for')
-                self._expect(lexer.TokSymbol(b','))
-                exp_end = self._assert(self._exp(), 'exp-end in for')
-                exp_step = None
-                if self._accept(lexer.TokSymbol(b',')):
-                    exp_step = self._assert(self._exp(), 'exp-step in for')
-                self._expect(lexer.TokKeyword(b'do'))
-                block = self._assert(self._chunk(), 'block in for')
-                self._expect(lexer.TokKeyword(b'end'))
-                return StatForStep(name, exp_init, exp_end, exp_step, block,
-                                   start=pos, end=self._pos)
-            self._pos = for_pos
+    def _stat_for(self):
+        """Parse a numeric or generic for stat."""
+        pos = self._pos
+        if self._accept(lexer.TokKeyword(b'for')) is None:
+            return None
+        for_pos = self._pos
 
-            namelist = self._assert(self._namelist(), 'namelist in for-in')
-            self._expect(lexer.TokKeyword(b'in'))
-            explist = self._assert(self._explist(), 'explist in for-in')
+        name = self._accept(lexer.TokName)
+        eq_sym = self._accept(lexer.TokSymbol(b'='))
+        if eq_sym is not None:
+            exp_init = self._assert(self._exp(), 'exp-init in for')
+            self._expect(lexer.TokSymbol(b','))
+            exp_end = self._assert(self._exp(), 'exp-end in for')
+            exp_step = None
+            if self._accept(lexer.TokSymbol(b',')):
+                exp_step = self._assert(self._exp(), 'exp-step in for')
             self._expect(lexer.TokKeyword(b'do'))
-            block = self._assert(self._chunk(), 'block in for-in')
+            block = self._assert(self._chunk(), 'block in for')
             self._expect(lexer.TokKeyword(b'end'))
-            return StatForIn(namelist, explist, block, start=pos, end=self._pos)
+            return StatForStep(name, exp_init, exp_end, exp_step, block,
+                               start=pos, end=self._pos)
+        self._pos = for_pos
+
+        namelist = self._assert(self._namelist(), 'namelist in for-in')
+        self._expect(lexer.TokKeyword(b'in'))
+        explist = self._assert(self._explist(), 'explist in for-in')
+        self._expect(lexer.TokKeyword(b'do'))
+        block = self._assert(self._chunk(), 'block in for-in')
+        self._expect(lexer.TokKeyword(b'end'))
+        return StatForIn(namelist, explist, block, start=pos, end=self._pos)
 
+    def _stat_function(self):
+        """Parse a function stat."""
+        pos = self._pos
+        if self._accept(lexer.TokKeyword(b'function')) is None:
+            return None
+        funcname = self._assert(self._funcname(), 'funcname in function')
+        funcbody = self._assert(self._funcbody(), 'funcbody in function')
+        return StatFunction(funcname, funcbody, start=pos, end=self._pos)
+
+    def _stat_local(self):
+        """Parse a local function or local assignment stat."""
+        pos = self._pos
+        if self._accept(lexer.TokKeyword(b'local')) is None:
+            return None
         if self._accept(lexer.TokKeyword(b'function')) is not None:
-            funcname = self._assert(self._funcname(), 'funcname in function')
-            funcbody = self._assert(self._funcbody(), 'funcbody in function')
-            return StatFunction(funcname, funcbody, start=pos, end=self._pos)
-
-        if self._accept(lexer.TokKeyword(b'local')) is not None:
-            if self._accept(lexer.TokKeyword(b'function')) is not None:
-                funcname = self._expect(lexer.TokName)
-                funcbody = self._assert(self._funcbody(),
-                                        'funcbody in local function')
-                return StatLocalFunction(funcname, funcbody,
-                                         start=pos, end=self._pos)
-            namelist = self._assert(self._namelist(),
-                                    'namelist in local assignment')
-            explist = None
-            if self._accept(lexer.TokSymbol(b'=')) is not None:
-                explist = self._assert(self._explist(),
-                                       'explist in local assignment')
-            return StatLocalAssignment(namelist, explist,
-                                       start=pos, end=self._pos)
+            funcname = self._expect(lexer.TokName)
+            funcbody = self._assert(self._funcbody(),
+                                    'funcbody in local function')
+            return StatLocalFunction(funcname, funcbody,
+                                     start=pos, end=self._pos)
+        namelist = self._assert(self._namelist(),
+                                'namelist in local assignment')
+        explist = None
+        if self._accept(lexer.TokSymbol(b'=')) is not None:
+            explist = self._assert(self._explist(),
+                                   'explist in local assignment')
+        return StatLocalAssignment(namelist, explist,
+                                   start=pos, end=self._pos)
 
-        if self._accept(lexer.TokKeyword(b'goto')) is not None:
-            label = self._expect(lexer.TokName)
-            return StatGoto(label.value, start=pos, end=self._pos)
+    def _stat_goto(self):
+        """Parse a goto stat."""
+        pos = self._pos
+        if self._accept(lexer.TokKeyword(b'goto')) is None:
+            return None
+        label = self._expect(lexer.TokName)
+        return StatGoto(label.value, start=pos, end=self._pos)
 
+    def _stat_label(self):
+        """Parse a label stat."""
+        pos = self._pos
         label = self._accept(lexer.TokLabel)
         if label is not None:
             # Remove colons from label.
             label_name = label.value[2:-2]
             return StatLabel(label_name, start=pos, end=self._pos)
-
-        self._pos = pos
         return None
 
     def _laststat(self):
@@ -608,7 +730,7 @@ class Parser():
         """
         pos = self._pos
         if self._accept(lexer.TokKeyword(b'break')) is not None:
-            return StatBreak(start=pos, end=self._pos)
+            return self._leaf(StatBreak, pos)
         if self._accept(lexer.TokKeyword(b'return')) is not None:
             explist = self._explist()
             return StatReturn(explist, start=pos, end=self._pos)
@@ -802,7 +924,7 @@ class Parser():
         if val is not None:
             return ExpValue(val, start=pos, end=self._pos)
         if self._accept(lexer.TokSymbol(b'...')) is not None:
-            return VarargDots(start=pos, end=self._pos)
+            return self._leaf(VarargDots, pos)
         val = self._function()
         if val is not None:
             return ExpValue(val, start=pos, end=self._pos)
@@ -989,7 +1111,7 @@ class Parser():
             dots_pos = self._pos
             dots = self._accept(lexer.TokSymbol(b'...'))
         if dots is not None:
-            dots = VarargDots(start=dots_pos, end=self._pos)
+            dots = self._leaf(VarargDots, dots_pos)
 
         self._expect(lexer.TokSymbol(b')'))
         block = self._assert(self._chunk(), 'block in funcbody')
@@ -1045,12 +1167,21 @@ class Parser():
             exp = self._assert(self._exp(), 'exp value in field')
             return FieldExpKey(key_exp, exp, start=pos, end=self._pos)
 
-        key_name = self._accept(lexer.TokName)
-        if (key_name is not None and
-                self._accept(lexer.TokSymbol(b'=')) is not None):
-            exp = self._assert(self._exp(), 'exp value in field')
-            return FieldNamedKey(key_name, exp, start=pos, end=self._pos)
-        self._pos = pos
+        # Look ahead for Name '=' so a plain exp field is parsed without
+        # consuming and rewinding the name.
+        name_pos = self._next_code_pos(pos)
+        if (name_pos < len(self._tokens) and
+                type(self._tokens[name_pos]) is lexer.TokName):
+            eq_pos = self._next_code_pos(name_pos + 1)
+            if (eq_pos < len(self._tokens) and
+                    self._tokens[eq_pos].matches(lexer.TokSymbol(b'='))):
+                key_name = self._accept(lexer.TokName)
+                if (key_name is not None and
+                        self._accept(lexer.TokSymbol(b'=')) is not None):
+                    exp = self._assert(self._exp(), 'exp value in field')
+                    return FieldNamedKey(key_name, exp, start=pos,
+                                         end=self._pos)
+                self._pos = pos
 
         exp = self._exp()
         if exp is not None:
@@ -1067,15 +1198,19 @@ class Parser():
 
         Args:
           tokens: An iterable of lexer.Token objects. All tokens will
-            be loaded into memory for processing.
+            be loaded into memory for processing. A list (such as
+            Lexer.tokens) is used as is and must not be modified while
+            the AST is in use.
 
         Raises:
           ParserError: Some pattern of tokens did not match the grammar.
         """
-        self._tokens = list(tokens)
+        self._tokens = tokens if isinstance(tokens, list) else list(tokens)
         self._pos = 0
+        self._leaf_nodes = {}
         self._ast = self._assert(self._chunk(), 'input to be a program')
         self._ast.store_token_groups(self._tokens)
+        self._leaf_nodes = {}
 
     @property
     def root(self):
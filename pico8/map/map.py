@@ -11,9 +11,15 @@ this is stored in the bottom of the gfx memory region.
 
 __all__ = ['Map']
 
+import binascii
+
 from .. import util
 
 
+# The bytes removed from .p8 map lines before decoding.
+_WHITESPACE = b' \t\r\n'
+
+
 class Map(util.BaseSection):
     """The map region of a PICO-8 cart."""
     HEX_LINE_LENGTH_BYTES = 128
@@ -29,8 +35,24 @@ class Map(util.BaseSection):
         if 'gfx' in kwargs:
             self._gfx = kwargs['gfx']
             del kwargs['gfx']
+        self._hex_lines = None
         super().__init__(*args, **kwargs)
 
+    @property
+    def _data(self):
+        """The map data region, decoded from .p8 lines on first access."""
+        if self._hex_lines is not None:
+            self._map_data = bytearray(
+                binascii.unhexlify(b''.join(self._hex_lines).translate(
+                    None, _WHITESPACE)))
+            self._hex_lines = None
+        return self._map_data
+
+    @_data.setter
+    def _data(self, data):
+        self._map_data = data
+        self._hex_lines = None
+
     @classmethod
     def empty(cls, version=4, gfx=None):
         """Creates an empty instance.
@@ -45,13 +67,22 @@ class Map(util.BaseSection):
         return cls(data=bytearray(b'\x00' * 4096), version=version, gfx=gfx)
 
     @classmethod
-    def from_lines(cls, *args, **kwargs):
-        gfx = None
-        if 'gfx' in kwargs:
-            gfx = kwargs['gfx']
-            del kwargs['gfx']
-        result = super().from_lines(*args, **kwargs)
-        result._gfx = gfx
+    def from_lines(cls, lines, version, gfx=None):
+        """Create an instance based on .p8 data lines.
+
+        The hexadecimal lines are not decoded until the map data is first
+        accessed, so tools that only read the Lua code skip the work.
+
+        Args:
+          lines: .p8 lines for the section.
+          version: The PICO-8 data version from the game file header.
+          gfx: The Gfx object where lower map data is written.
+
+        Returns:
+          A Map instance.
+        """
+        result = cls(data=b'', version=version, gfx=gfx)
+        result._hex_lines = list(lines)
         return result
 
     @classmethod
@@ -64,6 +95,22 @@ class Map(util.BaseSection):
         result._gfx = gfx
         return result
 
+    def _row_region(self, y):
+        """Locates the memory for a row of map cells.
+
+        Args:
+          y: The map cell y (row) coordinate. Map must have a Gfx if y > 31.
+            (0-63)
+
+        Returns:
+          A tuple (data, start): the bytearray holding the row, and the index
+          of the row's first cell in it.
+        """
+        assert (0 <= y <= 31) or ((0 <= y <= 63) and self._gfx is not None)
+        if y <= 31:
+            return self._data, y * 128
+        return self._gfx._data, 4096 + (y - 32) * 128
+
     def get_cell(self, x, y):
         """Gets the tile ID for a map cell.
 
@@ -125,15 +172,17 @@ class Map(util.BaseSection):
         assert 1 <= height
         assert ((0 <= y + height <= 32) or
                 ((0 <= y + height <= 64) and self._gfx is not None))
+        clip_x = min(x + width, 128)
+        clip_y = min(y + height, 64)
+        pad = bytes(x + width - clip_x)
         result = []
-        for tile_y in range(y, y + height):
-            row = bytearray()
-            for tile_x in range(x, x + width):
-                if (tile_y > 63) or (tile_x > 127):
-                    row.append(0)
-                else:
-                    row.append(self.get_cell(tile_x, tile_y))
+        for tile_y in range(y, clip_y):
+            data, start = self._row_region(tile_y)
+            row = data[start + x:start + clip_x]
+            row.extend(pad)
             result.append(row)
+        for tile_y in range(clip_y, y + height):
+            result.append(bytearray(width))
         return result
 
     def set_rect_tiles(self, rect, x, y):
@@ -150,11 +199,14 @@ class Map(util.BaseSection):
           y: The map tile y coordinate (row) of the upper left corner to
             start writing.
         """
-        for tile_y, row in enumerate(rect):
-            for tile_x, val in enumerate(row):
-                if ((tile_y + y) > 127) or ((tile_x + x) > 127):
-                    continue
-                self.set_cell(tile_x + x, tile_y + y, val)
+        for tile_y, row in enumerate(rect, y):
+            if tile_y > 63:
+                break
+            if x > 127:
+                continue
+            row = bytes(row)[:128 - x]
+            data, start = self._row_region(tile_y)
+            data[start + x:start + x + len(row)] = row
 
     def get_rect_pixels(self, x, y, width=1, height=1):
         """Gets a rectangel of map tiles as pixels.
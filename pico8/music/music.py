@@ -25,9 +25,24 @@ for a total of four bytes:
 
 __all__ = ['Music']
 
+import binascii
+import struct
+
 from .. import util
 
 
+# A pattern's four bytes as one little-endian word, read and written in place.
+_PATTERN_WORD = struct.Struct('<I')
+
+# A bytes.translate() table that clears the flag bit of a channel byte.
+_CLEAR_FLAG_BIT = bytes(i & 127 for i in range(256))
+
+# For each of a pattern's first three channel bytes, a bytes.translate() table
+# that maps the byte to its flag bit's place in the .p8 flags byte.
+_FLAG_BIT_TABLES = tuple(
+    bytes((i & 128) >> (7 - chan) for i in range(256)) for chan in range(3))
+
+
 class Music(util.BaseSection):
     @classmethod
     def empty(cls, version):
@@ -52,24 +67,52 @@ class Music(util.BaseSection):
         Returns:
           A Music instance with the loaded data.
         """
-        data = bytearray()
+        patterns = []
         for line in lines:
-            if line.find(b' ') == -1:
+            if line[2:3] == b' ' and line[11:] in (b'\n', b''):
+                # A well-formed line: two flag digits, a space and four
+                # channels.
+                patterns.append(line[:11] + b'\n')
+                continue
+            flagstr, sep, chanstr = line.partition(b' ')
+            if not sep:
                 continue
-            flagstr, chanstr = line.split(b' ')
-            flags = bytes.fromhex(str(flagstr, encoding='ascii'))[0]
-            fstop = (flags & 4) >> 2
-            frepeat = (flags & 2) >> 1
-            fnext = flags & 1
-
-            chan1 = bytes.fromhex(str(chanstr[0:2], encoding='ascii'))
-            chan2 = bytes.fromhex(str(chanstr[2:4], encoding='ascii'))
-            chan3 = bytes.fromhex(str(chanstr[4:6], encoding='ascii'))
-            chan4 = bytes.fromhex(str(chanstr[6:8], encoding='ascii'))
-            data.append(chan1[0] | fnext << 7)
-            data.append(chan2[0] | frepeat << 7)
-            data.append(chan3[0] | fstop << 7)
-            data.append(chan4[0])
+            patterns.append(flagstr + b' ' + chanstr[0:8] + b'\n')
+        return cls.from_buffer(b''.join(patterns), version=version)
+
+    @classmethod
+    def from_buffer(cls, buf, version):
+        """Parse the text of a music .p8 section into memory bytes.
+
+        Unlike from_lines(), this expects every line of the section to be a
+        well-formed pattern line.
+
+        Args:
+          buf: The music section as one bytes-like object: a line for each
+            pattern, with the flags, a space, and the four channels.
+          version: The PICO-8 data version from the game file header.
+
+        Returns:
+          A Music instance with the loaded data.
+        """
+        # Decode all patterns at once into 5-byte (flags, chan1-4) groups,
+        # then fold the flag bits into the high bits of channels 1-3. (The
+        # separators are deleted so the ASCII digits can be decoded directly,
+        # without converting the buffer to a str for bytes.fromhex().)
+        buf = bytes(buf)
+        num_patterns = buf.count(b' ')
+        raw = binascii.unhexlify(buf.translate(None, b' \r\n'))
+        if len(raw) != num_patterns * 5:
+            raise ValueError('malformed music pattern line')
+        flags = raw[0::5]
+        data = bytearray(num_patterns * 4)
+        data[0::4] = bytes(
+            c | (f & 1) << 7 for (f, c) in zip(flags, raw[1::5]))
+        data[1::4] = bytes(
+            c | (f & 2) << 6 for (f, c) in zip(flags, raw[2::5]))
+        data[2::4] = bytes(
+            c | (f & 4) << 5 for (f, c) in zip(flags, raw[3::5]))
+        data[3::4] = raw[4::5]
 
         return cls(data=data, version=version)
 
@@ -79,21 +122,48 @@ class Music(util.BaseSection):
         Yields:
           One line.
         """
-        for start_i in range(0, len(self._data), 4):
-            fstop = (self._data[start_i+2] & 128) >> 7
-            frepeat = (self._data[start_i+1] & 128) >> 7
-            fnext = (self._data[start_i] & 128) >> 7
-            p8flags = (fstop << 2) | (frepeat << 1) | fnext
-            chan1 = self._data[start_i] & 127
-            chan2 = self._data[start_i+1] & 127
-            chan3 = self._data[start_i+2] & 127
-            chan4 = self._data[start_i+3] & 127
-            yield (
-              bytes(util.bytes_to_hex(bytes([p8flags])), encoding='ascii') +
-              b' ' +
-              bytes(util.bytes_to_hex(bytes([chan1, chan2, chan3, chan4])),
-                    encoding='ascii') +
-              b'\n')
+        data = self._data
+        num_patterns = len(data) // 4
+
+        # Each channel's flag bit is moved into place with a translate table,
+        # then the three channels are combined as one big integer. The bits
+        # do not overlap, so OR-ing the integers packs every flags byte at
+        # once.
+        p8flags = 0
+        for chan, table in enumerate(_FLAG_BIT_TABLES):
+            p8flags |= int.from_bytes(data[chan::4].translate(table), 'big')
+        p8flags = p8flags.to_bytes(num_patterns, 'big')
+        chans = data.translate(_CLEAR_FLAG_BIT)
+
+        # Encode all patterns at once, then slice out each line.
+        flags_hex = binascii.hexlify(p8flags)
+        chans_hex = binascii.hexlify(chans)
+        for id in range(num_patterns):
+            yield (flags_hex[id * 2:id * 2 + 2] + b' ' +
+                   chans_hex[id * 8:id * 8 + 8] + b'\n')
+
+    def _get_pattern_word(self, id):
+        """Gets a pattern's four bytes as one little-endian word.
+
+        Channel N is bits 8N to 8N+7, so the flags are bits 7 (begin),
+        15 (end) and 23 (stop).
+
+        Args:
+          id: The music ID. (0-63)
+
+        Returns:
+          The pattern word.
+        """
+        return _PATTERN_WORD.unpack_from(self._data, id * 4)[0]
+
+    def _set_pattern_word(self, id, word):
+        """Sets a pattern's four bytes from one little-endian word.
+
+        Args:
+          id: The music ID. (0-63)
+          word: The pattern word. (See _get_pattern_word().)
+        """
+        _PATTERN_WORD.pack_into(self._data, id * 4, word)
 
     def get_channel(self, id, channel):
         """Gets the sfx ID on a channel for a given pattern.
@@ -107,7 +177,7 @@ class Music(util.BaseSection):
         """
         assert 0 <= id <= 63
         assert 0 <= channel <= 3
-        pattern = self._data[id * 4 + channel] & 0x7f
+        pattern = (self._get_pattern_word(id) >> (channel * 8)) & 0x7f
         if pattern > 63:
             return None
         return pattern
@@ -125,8 +195,10 @@ class Music(util.BaseSection):
         assert (pattern is None) or (0 <= pattern <= 63)
         if pattern is None:
             pattern = 0x40 + channel + 1
-        self._data[id * 4 + channel] = ((self._data[id * 4 + channel] & 0x80) |
-                                        pattern)
+        shift = channel * 8
+        self._set_pattern_word(
+            id, (self._get_pattern_word(id) & ~(0x7f << shift)) |
+            (pattern << shift))
 
     def get_properties(self, id):
         """Gets the properties of the music pattern.
@@ -145,10 +217,9 @@ class Music(util.BaseSection):
           A tuple: (being, end, stop). These are Booleans (True or False).
         """
         assert 0 <= id <= 63
-        begin = (self._data[id * 4] & 0x80) > 0
-        end = (self._data[id * 4 + 1] & 0x80) > 0
-        stop = (self._data[id * 4 + 2] & 0x80) > 0
-        return (begin, end, stop)
+        word = self._get_pattern_word(id)
+        return (bool(word & 0x80), bool(word & 0x8000),
+                bool(word & 0x800000))
 
     def set_properties(self, id, begin=None, end=None, stop=None):
         """Sets the properties of the music pattern.
@@ -165,12 +236,13 @@ class Music(util.BaseSection):
           stop: True to set the flag, False to unset the flag, or None to
             leave it unchanged.
         """
-        if begin is not None:
-            self._data[id * 4] = ((self._data[id * 4] & 0x7f) |
-                                  (0x80 if begin else 0x00))
-        if end is not None:
-            self._data[id * 4 + 1] = ((self._data[id * 4 + 1] & 0x7f) |
-                                      (0x80 if end else 0x00))
-        if stop is not None:
-            self._data[id * 4 + 2] = ((self._data[id * 4 + 2] & 0x7f) |
-                                      (0x80 if stop else 0x00))
+        mask = 0
+        flags = 0
+        for (value, bit) in ((begin, 0x80), (end, 0x8000), (stop, 0x800000)):
+            if value is not None:
+                mask |= bit
+                if value:
+                    flags |= bit
+        if mask:
+            self._set_pattern_word(
+                id, (self._get_pattern_word(id) & ~mask) | flags)
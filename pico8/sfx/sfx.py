@@ -40,6 +40,11 @@ note is encoded in 16 bits, LSB first, like so:
 
 __all__ = ['Sfx']
 
+import array
+import binascii
+import struct
+import sys
+
 from .. import util
 
 
@@ -68,12 +73,67 @@ EFFECT_FADE_OUT = 5
 EFFECT_ARP_FAST = 6
 EFFECT_ARP_SLOW = 7
 
+# The data for an empty sfx region. This emulates PICO-8 defaults: every
+# pattern is silent, pattern 0 has a note duration of 1, and the rest have a
+# note duration of 16.
+_EMPTY_DATA = ((bytes(65) + b'\x01' + bytes(2)) +
+               (bytes(65) + b'\x10' + bytes(2)) * 63)
+
+# A bytes.translate() table that maps ASCII hex digits to their values (0-15),
+# newlines to 0, and all other bytes to 0xff.
+_HEX_DIGIT_VALUES = bytes(
+    int(chr(i), 16) if chr(i) in '0123456789abcdefABCDEF' else
+    0 if chr(i) == '\n' else 0xff
+    for i in range(256))
+
+# A note's two bytes as one little-endian word, read and written in place.
+_NOTE_WORD = struct.Struct('<H')
+
+# The little-endian RAM note word without its pitch bits, indexed by the .p8
+# waveform, volume and effect digits as (waveform << 8) | (volume << 4) |
+# effect. (See set_note() for the bit layout.)
+_NOTE_WORDS = tuple(
+    (key >> 8 & 0x03) << 6 | (key >> 10 & 0x01) << 8 |
+    (key >> 4 & 0x07) << 9 | (key & 0x07) << 12 | (key >> 11 & 0x01) << 15
+    for key in range(4096))
+
+# The .p8 hex digits for a note's pitch, indexed by the note's LSB.
+_PITCH_HEX = tuple(b'%02x' % (lsb & 0x3f) for lsb in range(256))
+
+# The .p8 hex digits for a note's waveform, volume and effect, indexed by
+# (LSB >> 6) | (MSB << 2). (See set_note() for the bit layout.)
+_WAVEFORM_VOLUME_EFFECT_HEX = tuple(
+    b'%x%x%x' % ((key >> 6 & 0x08) | (key & 0x07),
+                 key >> 3 & 0x07,
+                 key >> 6 & 0x07)
+    for key in range(1024))
+
 
 class Sfx(util.BaseSection):
     """The sfx region of a PICO-8 cart."""
 
     HEX_LINE_LENGTH_BYTES = 84
 
+    def __init__(self, *args, **kwargs):
+        # The hex digit values of a .p8 sfx section that has not been decoded
+        # yet, or None.
+        self._nibbles = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def _data(self):
+        """The sfx data region, decoded from .p8 hex digits on first access."""
+        if self._nibbles is not None:
+            nibbles = self._nibbles
+            self._nibbles = None
+            self._decode_nibbles(nibbles)
+        return self._sfx_data
+
+    @_data.setter
+    def _data(self, data):
+        self._sfx_data = data
+        self._nibbles = None
+
     @classmethod
     def empty(cls, version):
         """Creates an empty instance.
@@ -84,14 +144,7 @@ class Sfx(util.BaseSection):
         Returns:
           A Sfx instance.
         """
-        result = cls(data=bytearray(b'\x00' * 4352), version=version)
-
-        # Emulate PICO-8 defaults:
-        result.set_properties(0, note_duration=1)
-        for i in range(1, 64):
-            result.set_properties(i, note_duration=16)
-
-        return result
+        return cls(data=_EMPTY_DATA, version=version)
 
     @classmethod
     def from_lines(cls, lines, version):
@@ -101,52 +154,87 @@ class Sfx(util.BaseSection):
           lines: .p8 lines for the section.
           version: The PICO-8 data version from the game file header.
         """
+        return cls.from_buffer(
+            b''.join(line[:168] + b'\n' for line in lines if len(line) == 169),
+            version=version)
+
+    @classmethod
+    def from_buffer(cls, buf, version):
+        """Create an instance from the text of a .p8 sfx section.
+
+        Unlike from_lines(), this expects every line of the section to be a
+        well-formed sfx line, and reads each line at its fixed offset.
+
+        The section is checked here, but the notes are not decoded until the
+        sfx data is first used. Tools that only read a cart's code never pay
+        for decoding its sfx.
+
+        Args:
+          buf: The sfx section as one bytes-like object: lines of 168 hex
+            digits, each followed by a newline.
+          version: The PICO-8 data version from the game file header.
+        """
         result = cls.empty(version=version)
-        id = 0
-
-        for line in lines:
-            if len(line) != 169:
-                continue
-            editor_mode = int(line[0:2], 16)
-            note_duration = int(line[2:4], 16)
-            loop_start = int(line[4:6], 16)
-            loop_end = int(line[6:8], 16)
-            result.set_properties(id,
-                                  editor_mode=editor_mode,
-                                  note_duration=note_duration,
-                                  loop_start=loop_start,
-                                  loop_end=loop_end)
-            note = 0
-            for i in range(8, 168, 5):
-                pitch = int(line[i:i+2], 16)
-                waveform = int(line[i+2:i+3], 16)
-                volume = int(line[i+3:i+4], 16)
-                effect = int(line[i+4:i+5], 16)
-                result.set_note(id, note,
-                                pitch=pitch,
-                                waveform=waveform,
-                                volume=volume,
-                                effect=effect)
-                note += 1
-            id += 1
 
+        # Convert every hex digit to its value (0-15) in one pass.
+        buf = bytes(buf)
+        all_nibbles = buf.translate(_HEX_DIGIT_VALUES)
+        num_lines = len(buf) // 169
+        if (len(buf) != num_lines * 169 or
+                buf[168::169] != b'\n' * num_lines or
+                max(all_nibbles, default=0) > 15):
+            raise ValueError('malformed sfx section')
+
+        result._nibbles = all_nibbles
         return result
 
+    def _decode_nibbles(self, all_nibbles):
+        """Decodes the hex digit values of a .p8 sfx section into the data.
+
+        Args:
+          all_nibbles: The value (0-15) of every hex digit of the section,
+            with one (ignored) value for each line's newline.
+        """
+        data = self._sfx_data
+        set_properties = self.set_properties
+        for id in range(len(all_nibbles) // 169):
+            nibbles = all_nibbles[id * 169:id * 169 + 168]
+            editor_mode = nibbles[0] << 4 | nibbles[1]
+            note_duration = nibbles[2] << 4 | nibbles[3]
+            loop_start = nibbles[4] << 4 | nibbles[5]
+            loop_end = nibbles[6] << 4 | nibbles[7]
+            set_properties(id,
+                           editor_mode=editor_mode,
+                           note_duration=note_duration,
+                           loop_start=loop_start,
+                           loop_end=loop_end)
+
+            # Encode the 32 notes straight into RAM layout as 16-bit words.
+            notes = array.array('H', (
+                _NOTE_WORDS[waveform << 8 | volume << 4 | effect] |
+                (pitch_hi << 4 | pitch_lo) & 0x3f
+                for (pitch_hi, pitch_lo, waveform, volume, effect) in zip(
+                    nibbles[8::5], nibbles[9::5], nibbles[10::5],
+                    nibbles[11::5], nibbles[12::5])))
+            if sys.byteorder != 'little':
+                notes.byteswap()
+            data[id * 68:id * 68 + 64] = notes.tobytes()
+
     def to_lines(self):
         """Generates lines of ASCII-encoded hexadecimal strings.
 
         Yields:
           One line of a hex string.
         """
+        data = self._data
         for id in range(0, 64):
-            hexstrs = [bytes(util.bytes_to_hex(
-                bytes(self.get_properties(id))), encoding='ascii')]
-            for note in range(0, 32):
-                pitch, waveform, volume, effect = self.get_note(id, note)
-                hexstrs.append(bytes(util.bytes_to_hex(
-                    bytes([pitch, waveform << 4 | volume])), encoding='ascii'))
-                hexstrs.append(bytes(util.bytes_to_hex(
-                    bytes([effect]))[1], encoding='ascii'))
+            start = id * 68
+            hexstrs = [binascii.hexlify(data[start + 64:start + 68])]
+            for lsb, msb in zip(data[start:start + 64:2],
+                                data[start + 1:start + 64:2]):
+                hexstrs.append(_PITCH_HEX[lsb])
+                hexstrs.append(
+                    _WAVEFORM_VOLUME_EFFECT_HEX[lsb >> 6 | msb << 2])
             yield b''.join(hexstrs) + b'\n'
 
     def get_note(self, id, note):
@@ -168,13 +256,11 @@ class Sfx(util.BaseSection):
         Returns:
           A tuple: (pitch, waveform, volume, effect).
         """
-        lsb = self._data[id * 68 + note * 2]
-        msb = self._data[id * 68 + note * 2 + 1]
-        pitch = lsb & 0x3f
-        waveform = ((msb & 0x80) >> 4) | (
-            (msb & 0x01) << 2) | ((lsb & 0xc0) >> 6)
-        volume = (msb & 0x0e) >> 1
-        effect = (msb & 0x70) >> 4
+        word = _NOTE_WORD.unpack_from(self._data, id * 68 + note * 2)[0]
+        pitch = word & 0x3f
+        waveform = (word >> 6) & 0x07 | (word >> 12) & 0x08
+        volume = (word >> 9) & 0x07
+        effect = (word >> 12) & 0x07
         return pitch, waveform, volume, effect
 
     def set_note(self, id, note, pitch=None, waveform=None, volume=None,
@@ -191,25 +277,32 @@ class Sfx(util.BaseSection):
           volume: The volume level, or None to leave unchanged. (0-7)
           effect: The effect type, or None to leave unchanged. (0-7)
         """
-        lsb = self._data[id * 68 + note * 2]
-        msb = self._data[id * 68 + note * 2 + 1]
-
+        # Collect the bits to replace and their new values, then update the
+        # note word once.
+        mask = 0
+        bits = 0
         if pitch is not None:
             assert 0 <= pitch <= 63
-            lsb = (lsb & 0xc0) | pitch
+            mask |= 0x003f
+            bits |= pitch
         if waveform is not None:
             assert 0 <= waveform <= 15
-            lsb = (lsb & 0x3f) | ((waveform & 3) << 6)
-            msb = (msb & 0x7e) | ((waveform & 4) >> 2) | ((waveform & 8) << 4)
+            mask |= 0x81c0
+            bits |= (waveform & 0x07) << 6 | (waveform & 0x08) << 12
         if volume is not None:
             assert 0 <= volume <= 7
-            msb = (msb & 0xf1) | (volume << 1)
+            mask |= 0x0e00
+            bits |= volume << 9
         if effect is not None:
             assert 0 <= effect <= 7
-            msb = (msb & 0x8f) | (effect << 4)
+            mask |= 0x7000
+            bits |= effect << 12
 
-        self._data[id * 68 + note * 2] = lsb
-        self._data[id * 68 + note * 2 + 1] = msb
+        data = self._data
+        i = id * 68 + note * 2
+        if mask != 0xffff:
+            bits |= _NOTE_WORD.unpack_from(data, i)[0] & ~mask
+        _NOTE_WORD.pack_into(data, i, bits)
 
     def get_properties(self, id):
         """Gets properties for a pattern.
@@ -229,10 +322,8 @@ class Sfx(util.BaseSection):
         Returns:
           A tuple: (editor_mode, note_duration, loop_start, loop_end).
         """
-        return (self._data[id * 68 + 64],
-                self._data[id * 68 + 65],
-                self._data[id * 68 + 66],
-                self._data[id * 68 + 67])
+        i = id * 68 + 64
+        return tuple(self._data[i:i + 4])
 
     def set_properties(self, id, editor_mode=None, note_duration=None,
                        loop_start=None, loop_end=None):
@@ -252,15 +343,17 @@ class Sfx(util.BaseSection):
         # (The asserts are only appropriate if the cart uses the sfx memory
         # for actual sfx, which not all carts do. Keeping them for
         # documentation purposes.)
+        data = self._data
+        i = id * 68 + 64
         if editor_mode is not None:
             # assert 0 <= editor_mode <= 1
-            self._data[id * 68 + 64] = editor_mode
+            data[i] = editor_mode
         if note_duration is not None:
             # assert 0 <= note_duration <= 255
-            self._data[id * 68 + 65] = note_duration
+            data[i + 1] = note_duration
         if loop_start is not None:
             # assert 0 <= loop_start <= 63
-            self._data[id * 68 + 66] = loop_start
+            data[i + 2] = loop_start
         if loop_end is not None:
             # assert 0 <= loop_end <= 63
-            self._data[id * 68 + 67] = loop_end
+            data[i + 3] = loop_end
@@ -4,11 +4,18 @@ __all__ = ['main']
 
 
 import argparse
-import csv
+import bisect
+import collections
+import hashlib
+import io
+import itertools
 import os
+import pickle
 import re
 import sys
-import traceback
+import zlib
+from typing import Dict
+from typing import Optional
 
 from . import util
 from .build import build
@@ -19,42 +26,393 @@ from .lua import lua
 from .lua import parser
 
 
-def _games_for_filenames(filenames):
+def _format_exc():
+    """Formats the exception being handled, as traceback.format_exc() does.
+
+    traceback is only imported when there is an error to report, since it is
+    slow to import.
+
+    Returns:
+      The formatted exception and traceback.
+    """
+    import traceback
+    return traceback.format_exc()
+
+
+# The fingerprint of the picotool source files, computed by
+# _get_code_fingerprint().
+_code_fingerprint = None
+
+
+def _get_code_fingerprint():
+    """Gets a fingerprint of the installed picotool source files.
+
+    The fingerprint is part of every cart cache key, so that upgrading or
+    editing picotool does not load games pickled by an older version.
+
+    Returns:
+      The fingerprint, as a string.
+    """
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        h = hashlib.blake2b(digest_size=16)
+        pkg_dir = os.path.dirname(os.path.abspath(__file__))
+        for dirpath, dirnames, filenames in os.walk(pkg_dir):
+            dirnames.sort()
+            for fn in sorted(filenames):
+                if fn.endswith('.py'):
+                    st = os.stat(os.path.join(dirpath, fn))
+                    h.update('{}|{}|{}\n'.format(
+                        os.path.join(dirpath, fn), st.st_mtime_ns,
+                        st.st_size).encode('utf-8'))
+        _code_fingerprint = h.hexdigest()
+    return _code_fingerprint
+
+
+def _get_cache_dir():
+    """Gets the directory for the cart cache.
+
+    Returns:
+      $XDG_CACHE_HOME/picotool, or ~/.cache/picotool if XDG_CACHE_HOME is not
+      set.
+    """
+    cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'picotool')
+
+
+def _get_cache_filename(fname, parse):
+    """Gets the cart cache filename for a cart file.
+
+    The cache key is the cart's absolute path, modification time and size,
+    so an edited cart is a cache miss.
+
+    Args:
+      fname: The cart filename.
+      parse: True if the cached game has a parsed Lua AST.
+
+    Returns:
+      The cache filename, or None if the cart file cannot be stat'd.
+    """
+    try:
+        st = os.stat(fname)
+    except OSError:
+        return None
+    key = hashlib.blake2b('{}|{}|{}|{}'.format(
+        os.path.abspath(fname), st.st_mtime_ns, st.st_size,
+        _get_code_fingerprint()).encode('utf-8'), digest_size=16).hexdigest()
+    return os.path.join(
+        _get_cache_dir(), key + ('.pkl' if parse else '.tokens.pkl'))
+
+
+# The zlib compression level for cart cache files. Pickled games are mostly
+# empty gfx and map data, so even the fastest level makes them about five
+# times smaller, and decompressing costs less than unpickling.
+_CACHE_COMPRESSION_LEVEL = 1
+
+
+def _read_cached_game(cache_fname):
+    """Reads a game from the cart cache.
+
+    Args:
+      cache_fname: The cache filename.
+
+    Returns:
+      The Game, or None if it is not in the cache or cannot be read.
+    """
+    try:
+        with open(cache_fname, 'rb') as fh:
+            return pickle.loads(zlib.decompress(fh.read()))
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # A damaged cache file is just a cache miss.
+        util.debug(_format_exc())
+        return None
+
+
+def _write_cached_game(cache_fname, fname, g):
+    """Writes a game to the cart cache.
+
+    .p8 carts that use #include are not cached, because a change to an
+    included file does not change the cache key.
+
+    Args:
+      cache_fname: The cache filename.
+      fname: The cart filename.
+      g: The Game.
+    """
+    tmp_fname = None
+    try:
+        if fname.endswith('.p8'):
+            with open(fname, 'rb') as fh:
+                if b'#include' in fh.read():
+                    return
+        # (Imported here to keep it out of the startup cost of cache hits.)
+        import tempfile
+        cache_dir = os.path.dirname(cache_fname)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_fname = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(zlib.compress(
+                pickle.dumps(g, protocol=pickle.HIGHEST_PROTOCOL),
+                _CACHE_COMPRESSION_LEVEL))
+        os.replace(tmp_fname, cache_fname)
+        tmp_fname = None
+    except (OSError, pickle.PicklingError, RecursionError, zlib.error):
+        # The cache is an optimization, so failing to write it is not an
+        # error.
+        util.debug(_format_exc())
+    finally:
+        if tmp_fname is not None and os.path.exists(tmp_fname):
+            os.unlink(tmp_fname)
+
+
+def _load_game(fname, parse=True, use_cache=False, data=None):
+    """Loads a game from a file, catching errors for the caller to report.
+
+    This is a module-level function so that it can run in a worker process.
+
+    Args:
+      fname: The filename.
+      parse: If False, the Lua code is lexed but not parsed.
+      use_cache: If True, reads the game from the cart cache if it is there,
+        and stores it there if it is not.
+      data: The contents of the file, if they have already been read.
+
+    Returns:
+      (game, None, None) on success, or (None, message, traceback) if the
+      file did not load or parse as a game.
+    """
+    cache_fname = _get_cache_filename(fname, parse) if use_cache else None
+    if cache_fname is not None:
+        g = _read_cached_game(cache_fname)
+        if g is not None:
+            g.filename = fname
+            return (g, None, None)
+
+    try:
+        if data is None:
+            g = file.from_file(fname, parse=parse)
+        else:
+            g = file.from_bytes(data, fname, parse=parse)
+    except (lexer.LexerError, parser.ParserError,
+            util.InvalidP8DataError, OSError) as e:
+        return (None, str(e), _format_exc())
+
+    if cache_fname is not None:
+        _write_cached_game(cache_fname, fname, g)
+    return (g, None, None)
+
+
+# The number of files that _load_games_in_order() reads ahead of the game it
+# is loading.
+_PREFETCH_COUNT = 2
+
+
+def _read_file(fname):
+    """Reads the contents of a file.
+
+    Args:
+      fname: The filename.
+
+    Returns:
+      The contents, as a bytestring.
+    """
+    with open(fname, 'rb') as fh:
+        return fh.read()
+
+
+def _load_games_in_order(fnames, parse=True, use_cache=False):
+    """Loads games one at a time in this process.
+
+    The next few files are read by a thread while the current game is
+    parsed, so waiting on the disk overlaps with parsing.
+
+    Args:
+      fnames: The list of cart filenames.
+      parse: If False, the Lua code is lexed but not parsed.
+      use_cache: If True, games are read from and stored in the cart cache.
+
+    Yields:
+      The _load_game() result for each filename, in order.
+    """
+    if len(fnames) < 2:
+        for fname in fnames:
+            yield _load_game(fname, parse=parse, use_cache=use_cache)
+        return
+
+    # (Imported here because single-cart runs do not need it.)
+    import concurrent.futures
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as reader:
+        reads = collections.deque(
+            reader.submit(_read_file, fname)
+            for fname in fnames[:_PREFETCH_COUNT])
+        for i, fname in enumerate(fnames):
+            if i + _PREFETCH_COUNT < len(fnames):
+                reads.append(
+                    reader.submit(_read_file, fnames[i + _PREFETCH_COUNT]))
+            try:
+                data = reads.popleft().result()
+            except OSError as e:
+                yield (None, str(e), _format_exc())
+                continue
+            yield _load_game(
+                fname, parse=parse, use_cache=use_cache, data=data)
+
+
+# The number of carts per worker process that _load_games_in_pool() keeps
+# submitted ahead of the game it is yielding.
+_POOL_PREFETCH_PER_WORKER = 2
+
+
+def _load_games_in_pool(executor, fnames, window, parse=True,
+                        use_cache=False):
+    """Loads games in a pool of worker processes.
+
+    Only a window of carts is submitted ahead of the game being yielded, so
+    loaded games do not pile up in this process. If the caller stops early,
+    the carts that have not started loading are cancelled.
+
+    Args:
+      executor: The concurrent.futures.ProcessPoolExecutor.
+      fnames: The list of cart filenames.
+      window: The number of carts to keep submitted.
+      parse: If False, the Lua code is lexed but not parsed.
+      use_cache: If True, games are read from and stored in the cart cache.
+
+    Yields:
+      The _load_game() result for each filename, in order.
+    """
+    fname_iter = iter(fnames)
+    pending = collections.deque()
+    try:
+        for fname in itertools.islice(fname_iter, window):
+            pending.append(
+                executor.submit(_load_game, fname, parse, use_cache))
+        while pending:
+            result = pending.popleft().result()
+            for fname in itertools.islice(fname_iter, 1):
+                pending.append(
+                    executor.submit(_load_game, fname, parse, use_cache))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _use_cache(args):
+    """Checks whether a command should use the cart cache.
+
+    Args:
+      args: The argparse parsed args object, or None.
+
+    Returns:
+      True if --cache was given.
+    """
+    return args is not None and getattr(args, 'cache', False)
+
+
+# The filename suffixes of cart files.
+_CART_SUFFIXES = ('.p8.png', '.p8')
+
+
+def _expand_cart_dirs(filenames):
+    """Replaces directory arguments with the carts they contain.
+
+    A directory is replaced by the files directly inside it whose names end
+    in .p8 or .p8.png, in sorted order. Other files in the directory are
+    skipped without being opened. Only arguments without a cart suffix are
+    checked for being directories, so plain cart arguments cost no extra
+    system calls.
+
+    Args:
+      filenames: The list of filename arguments.
+
+    Returns:
+      The list of filenames with directories expanded.
+    """
+    result = []
+    for fname in filenames:
+        if fname.endswith(_CART_SUFFIXES) or not os.path.isdir(fname):
+            result.append(fname)
+            continue
+        with os.scandir(fname) as entries:
+            result.extend(sorted(
+                entry.path for entry in entries
+                if entry.name.endswith(_CART_SUFFIXES) and entry.is_file()))
+    return result
+
+
+def _games_for_filenames(filenames, parse=True, use_cache=False):
     """Yields games for the given filenames.
 
     If a file does not load or parse as a game, this writes a message
     to stderr and yields None. Processing of the argument list will
     continue if the caller continues.
 
+    When there is more than one file and more than one CPU, the files are
+    loaded in parallel by a pool of worker processes. Otherwise, the files
+    are loaded in this process while a thread reads ahead. Games are still
+    yielded in argument order.
+
     Args:
       filenames: The list of filenames.
+      parse: If False, the Lua code is lexed but not parsed. This is faster
+        for commands that only need the token stream, and the games' lua.root
+        is None.
+      use_cache: If True, games are read from and stored in the cart cache.
 
     Yields:
       (filename, game), or (filename, None) if the file did not parse.
     """
-    for fname in filenames:
-        if not fname.endswith('.p8.png') and not fname.endswith('.p8'):
-            util.error('{}: filename must end in .p8 or .p8.png\n'.format(
-                fname))
-            continue
-
-        g = None
+    valid_fnames = [fname for fname in filenames
+                    if fname.endswith(_CART_SUFFIXES)]
+
+    executor = None
+    cpus = os.cpu_count() or 1
+    # (With one CPU, worker processes only add the cost of sending each
+    # game back to this process.)
+    if len(valid_fnames) > 1 and cpus > 1:
+        # (Imported here because single-cart runs do not need it.)
+        import concurrent.futures
         try:
-            g = file.from_file(fname)
-        except lexer.LexerError as e:
-            util.error('{}: {}\n'.format(fname, e))
-            util.debug(traceback.format_exc())
-            yield (fname, None)
-        except parser.ParserError as e:
-            util.error('{}: {}\n'.format(fname, e))
-            util.debug(traceback.format_exc())
-            yield (fname, None)
-        except util.InvalidP8DataError as e:
-            util.error('{}: {}\n'.format(fname, e))
-            util.debug(traceback.format_exc())
-            yield (fname, None)
-        else:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(cpus, len(valid_fnames)))
+        except (OSError, NotImplementedError):
+            # Some platforms cannot start worker processes.
+            util.debug(_format_exc())
+    if executor is not None:
+        results = _load_games_in_pool(
+            executor, valid_fnames,
+            _POOL_PREFETCH_PER_WORKER * min(cpus, len(valid_fnames)),
+            parse=parse, use_cache=use_cache)
+    else:
+        results = _load_games_in_order(
+            valid_fnames, parse=parse, use_cache=use_cache)
+
+    try:
+        for fname in filenames:
+            if not fname.endswith(_CART_SUFFIXES):
+                util.error('{}: filename must end in .p8 or .p8.png\n'.format(
+                    fname))
+                continue
+
+            g, msg, tb = next(results)
+            if g is None:
+                util.error('{}: {}\n'.format(fname, msg))
+                util.debug(tb)
             yield (fname, g)
+    finally:
+        # (Closing the results first cancels any carts still waiting for a
+        # worker, so shutting down only waits for the ones being loaded.)
+        results.close()
+        if executor is not None:
+            executor.shutdown()
+
+
+# A bytes.translate() table that maps high characters to b'_'.
+_FRIENDLY_BYTES = bytes(range(128)) + b'_' * 128
 
 
 def _as_friendly_string(s):
@@ -71,11 +429,14 @@ def _as_friendly_string(s):
     """
     if s is None:
         return None
-    s_arr = bytearray(s)
-    for i, c in enumerate(s_arr):
-        if c > 127:
-            s_arr[i] = 95  # ASCII for b'_'
-    return str(s_arr, encoding='ascii')
+    if s.isascii():
+        # (Most code and titles are plain ASCII and need no translation.)
+        return s.decode('ascii')
+    return str(s.translate(_FRIENDLY_BYTES), encoding='ascii')
+
+
+# The number of carts whose stats are written to stdout together as CSV.
+_STATS_CSV_BATCH_SIZE = 1000
 
 
 def stats(args):
@@ -87,10 +448,18 @@ def stats(args):
     Returns:
       0 on success, 1 on failure.
     """
+    # CSV rows are collected, formatted into a buffer with one writerows()
+    # call per batch, and written to stdout. The header row starts the first
+    # batch.
+    csv_buffer = None
     csv_writer = None
+    csv_rows = []
     if args.csv:
-        csv_writer = csv.writer(sys.stdout)
-        csv_writer.writerow([
+        # (Imported here because only CSV output needs it.)
+        import csv
+        csv_buffer = io.StringIO()
+        csv_writer = csv.writer(csv_buffer)
+        csv_rows.append((
             'Filename',
             'Title',
             'Byline',
@@ -99,43 +468,65 @@ def stats(args):
             'Token Count',
             'Line Count',
             'Compressed Code Size'
-        ])
-
-    for fname, g in _games_for_filenames(args.filename):
+        ))
+    basename = os.path.basename
+    write = util.write
+
+    # (Every statistic comes from the token stream, so the carts are lexed
+    # but not parsed.)
+    for fname, g in _games_for_filenames(
+            args.filename, parse=False, use_cache=_use_cache(args)):
         if g is None:
             util.error('{}: could not load cart\n'.format(fname))
             if len(args.filename) == 1:
+                if args.csv:
+                    csv_writer.writerows(csv_rows)
+                    sys.stdout.write(csv_buffer.getvalue())
                 return 1
             continue
 
+        lua_stats = g.lua.get_stats()
+        title = _as_friendly_string(lua_stats.title)
+        byline = _as_friendly_string(lua_stats.byline)
+        compressed_size = g.get_compressed_size()
+
         if args.csv:
-            csv_writer.writerow([
-                os.path.basename(fname),
-                _as_friendly_string(g.lua.get_title()),
-                _as_friendly_string(g.lua.get_byline()),
-                g.lua.version,
-                g.lua.get_char_count(),
-                g.lua.get_token_count(),
-                g.lua.get_line_count(),
-                g.get_compressed_size()
-            ])
+            csv_rows.append((
+                basename(fname),
+                title,
+                byline,
+                lua_stats.version,
+                lua_stats.char_count,
+                lua_stats.token_count,
+                lua_stats.line_count,
+                compressed_size
+            ))
+            if len(csv_rows) >= _STATS_CSV_BATCH_SIZE:
+                csv_writer.writerows(csv_rows)
+                csv_rows = []
+                sys.stdout.write(csv_buffer.getvalue())
+                csv_buffer.seek(0)
+                csv_buffer.truncate()
         else:
-            title = _as_friendly_string(g.lua.get_title())
-            byline = _as_friendly_string(g.lua.get_byline())
-
             if title is not None:
-                util.write('{} ({})\n'.format(
-                    title, os.path.basename(g.filename)))
+                parts = ['{} ({})\n'.format(title, basename(g.filename))]
             else:
-                util.write(os.path.basename(g.filename) + '\n')
+                parts = [basename(g.filename) + '\n']
             if byline is not None:
-                util.write(byline + '\n')
-            util.write('- version: {}\n- lines: {}\n- chars: {}\n'
-                       '- tokens: {}\n- compressed chars: {}\n'.format(
-                           g.lua.version, g.lua.get_line_count(),
-                           g.lua.get_char_count(), g.lua.get_token_count(),
-                           g.get_compressed_size()))
-            util.write('\n')
+                parts.append(byline + '\n')
+            parts.append('- version: {}\n- lines: {}\n- chars: {}\n'
+                         '- tokens: {}\n- compressed chars: {}\n\n'.format(
+                             lua_stats.version, lua_stats.line_count,
+                             lua_stats.char_count, lua_stats.token_count,
+                             compressed_size))
+            write(''.join(parts))
+
+    if args.csv:
+        if csv_rows:
+            csv_writer.writerows(csv_rows)
+        if csv_buffer.tell():
+            sys.stdout.write(csv_buffer.getvalue())
+        sys.stdout.flush()
 
     return 0
 
@@ -149,22 +540,27 @@ def listlua(args):
     Returns:
       0 on success, 1 on failure.
     """
-    for fname, g in _games_for_filenames(args.filename):
+    multiple_files = len(args.filename) > 1
+    for fname, g in _games_for_filenames(
+            args.filename, parse=False, use_cache=_use_cache(args)):
         if g is None:
             util.error('{}: could not load cart\n'.format(fname))
-            if len(args.filename) == 1:
+            if not multiple_files:
                 return 1
             continue
-        if len(args.filename) > 1:
-            util.write('=== {} ===\n'.format(g.filename))
-
-        for index, line in enumerate(g.lua.to_lines(
-                writer_cls=(lua.PureLuaWriter if args.pure_lua else None))):
-            if args.show_line_numbers:
-                util.write('{}: {}'.format(index, _as_friendly_string(line)))
-            else:
-                util.write(_as_friendly_string(line))
-        util.write('\n')
+        out = []
+        if multiple_files:
+            out.append('=== {} ===\n'.format(g.filename))
+
+        lines = g.lua.to_lines(
+            writer_cls=(lua.PureLuaWriter if args.pure_lua else None))
+        if args.show_line_numbers:
+            out.extend('{}: {}'.format(index, _as_friendly_string(line))
+                       for index, line in enumerate(lines))
+        else:
+            out.append(_as_friendly_string(b''.join(lines)))
+        out.append('\n')
+        util.write(''.join(out))
 
     return 0
 
@@ -178,6 +574,7 @@ def listrawlua(args):
     Returns:
       0 on success, 1 on failure.
     """
+    multiple_files = len(args.filename) > 1
     for fname in args.filename:
         if fname.endswith('.p8.png'):
             with open(fname, 'rb') as fh:
@@ -189,18 +586,20 @@ def listrawlua(args):
                 raw_lua = data.section_lines['lua']
         else:
             util.error('{}: must be .p8 or .p8.png\n'.format(fname))
-            if len(args.filename) == 1:
+            if not multiple_files:
                 return 1
             continue
 
-        if len(args.filename) > 1:
-            util.write('=== {} ===\n'.format(fname))
-        for i, l in enumerate(raw_lua):
-            if args.show_line_numbers:
-                util.write('{}: {}\n'.format(i, _as_friendly_string(l)))
-            else:
-                util.write(_as_friendly_string(l) + '\n')
-        util.write('\n')
+        out = []
+        if multiple_files:
+            out.append('=== {} ===\n'.format(fname))
+        if args.show_line_numbers:
+            out.extend('{}: {}\n'.format(i, _as_friendly_string(line))
+                       for i, line in enumerate(raw_lua))
+        else:
+            out.extend(_as_friendly_string(line) + '\n' for line in raw_lua)
+        out.append('\n')
+        util.write(''.join(out))
 
     return 0
 
@@ -214,28 +613,57 @@ def listtokens(args):
     Returns:
       0 on success, 1 on failure.
     """
-    for fname, g in _games_for_filenames(args.filename):
+    tok_newline = lexer.TokNewline
+    tok_space = lexer.TokSpace
+    tok_comment = lexer.TokComment
+    multiple_files = len(args.filename) > 1
+    for fname, g in _games_for_filenames(
+            args.filename, parse=False, use_cache=_use_cache(args)):
         if g is None:
             util.error('{}: could not load cart\n'.format(fname))
-            if len(args.filename) == 1:
+            if not multiple_files:
                 return 1
             continue
-        if len(args.filename) > 1:
-            util.write('=== {} ===\n'.format(g.filename))
+        out = []
+        append = out.append
+        if multiple_files:
+            append('=== {} ===\n'.format(g.filename))
         pos = 0
         for t in g.lua.tokens:
-            if isinstance(t, lexer.TokNewline):
-                util.write('\n')
-            elif (isinstance(t, lexer.TokSpace) or
-                  isinstance(t, lexer.TokComment)):
-                util.write('<{}>'.format(t.value))
+            # (Up to three identity checks on the type measure faster here
+            # than a dict lookup of a per-type handler or format string, and
+            # concatenation is faster than str.format().)
+            t_type = type(t)
+            if t_type is tok_newline:
+                append('\n')
+            elif t_type is tok_space or t_type is tok_comment:
+                append('<' + str(t.value) + '>')
             else:
-                util.write('<{}:{}>'.format(pos, t.value))
+                append('<' + str(pos) + ':' + str(t.value) + '>')
                 pos += 1
-        util.write('\n')
+        append('\n')
+        util.write(''.join(out))
     return 0
 
 
+def _out_fname(fname, overwrite):
+    """Gets the output filename for a cart processed by process_game_files.
+
+    Args:
+      fname: The input filename, ending in .p8 or .p8.png.
+      overwrite: If True and the input is a .p8 file, the input filename is
+        returned unchanged.
+
+    Returns:
+      The output filename.
+    """
+    if fname.endswith('.p8.png'):
+        return fname[:-len('.p8.png')] + '_fmt.p8.png'
+    if overwrite:
+        return fname
+    return fname[:-len('.p8')] + '_fmt.p8'
+
+
 def process_game_files(filenames, procfunc, overwrite=False, args=None):
     """Processes cart files in a common way.
 
@@ -252,19 +680,13 @@ def process_game_files(filenames, procfunc, overwrite=False, args=None):
       0 on success, 1 on failure.
     """
     has_errors = False
-    for fname, g in _games_for_filenames(filenames):
+    for fname, g in _games_for_filenames(
+            filenames, use_cache=_use_cache(args)):
         if g is None:
             has_errors = True
             continue
 
-        if overwrite and fname.endswith('.p8'):
-            out_fname = fname
-        else:
-            if fname.endswith('.p8.png'):
-                out_fname = fname[:-len('.p8.png')] + '_fmt.p8.png'
-            else:
-                out_fname = fname[:-len('.p8')] + '_fmt.p8'
-
+        out_fname = _out_fname(fname, overwrite)
         util.write('{} -> {}\n'.format(fname, out_fname))
         procfunc(g, out_fname, args=args)
 
@@ -323,29 +745,50 @@ def luafmt(g, out_fname, args=None):
 _PRINTAST_INDENT_SIZE = 2
 
 
-def _printast_node(value, indent=0, prefix=''):
-    """Recursive procedure for printast.
+def _printast_node(value, indent=0, prefix='', header=''):
+    """Prints an AST value and everything under it.
+
+    The tree is walked with an explicit stack, and the output is written
+    with a single util.write().
 
     Args:
       value: An element from the AST: a Node, a list, or a tuple.
       indent: The indentation level for this value.
       prefix: A string prefix for this value.
+      header: A string written before the tree.
     """
-    if isinstance(value, parser.Node):
-        util.write('{}{}{}\n'.format(' ' * indent, prefix,
-                                     value.__class__.__name__))
-        for field in value._fields:
-            _printast_node(getattr(value, field),
-                           indent=indent+_PRINTAST_INDENT_SIZE,
-                           prefix='* {}: '.format(field))
-    elif isinstance(value, list) or isinstance(value, tuple):
-        util.write('{}{}[list:]\n'.format(' ' * indent, prefix))
-        for item in value:
-            _printast_node(item,
-                           indent=indent+_PRINTAST_INDENT_SIZE,
-                           prefix='- ')
-    else:
-        util.write('{}{}{}\n'.format(' ' * indent, prefix, value))
+    out = [header]
+    append = out.append
+    indent_step = ' ' * _PRINTAST_INDENT_SIZE
+    # (The stack holds each value's indentation as a string, and the field
+    # prefixes for each node class are built once.)
+    field_prefixes = {}
+    stack = [(value, ' ' * indent, prefix)]
+    pop = stack.pop
+    push = stack.append
+    node_base = parser.Node
+    while stack:
+        value, pad, prefix = pop()
+        if isinstance(value, node_base):
+            node_cls = value.__class__
+            append(pad + prefix + node_cls.__name__ + '\n')
+            fields = field_prefixes.get(node_cls)
+            if fields is None:
+                # (Children are pushed in reverse so they pop in order.)
+                fields = field_prefixes[node_cls] = [
+                    (field, '* {}: '.format(field))
+                    for field in reversed(value._fields)]
+            child_pad = pad + indent_step
+            for field, field_prefix in fields:
+                push((getattr(value, field), child_pad, field_prefix))
+        elif isinstance(value, list) or isinstance(value, tuple):
+            append(pad + prefix + '[list:]\n')
+            child_pad = pad + indent_step
+            for item in reversed(value):
+                push((item, child_pad, '- '))
+        else:
+            append('{}{}{}\n'.format(pad, prefix, value))
+    util.write(''.join(out))
 
 
 def printast(args):
@@ -357,18 +800,73 @@ def printast(args):
     Returns:
       0 on success, 1 on failure.
     """
-    for fname, g in _games_for_filenames(args.filename):
+    multiple_files = len(args.filename) > 1
+    for fname, g in _games_for_filenames(
+            args.filename, use_cache=_use_cache(args)):
         if g is None:
             util.error('{}: could not load cart\n'.format(fname))
-            if len(args.filename) == 1:
+            if not multiple_files:
                 return 1
             continue
-        if len(args.filename) > 1:
-            util.write('=== {} ===\n'.format(g.filename))
-        _printast_node(g.lua.root)
+        _printast_node(
+            g.lua.root,
+            header=('=== {} ===\n'.format(g.filename)
+                    if multiple_files else ''))
     return 0
 
 
+# Pattern syntax that can see past the edges of a line, so the lines cannot be
+# searched as one buffer.
+_WHOLE_BUFFER_SYNTAX = (b'\\A', b'\\Z', b'(?<=', b'(?<!')
+
+
+def _matching_lines(pattern, lines):
+    """Finds the lines that contain a match for a pattern.
+
+    Each line is matched on its own. The lines are first searched as one
+    buffer, so the regular expression engine skips over non-matching lines
+    without returning to Python, and every line with a hit in the buffer is
+    confirmed by searching that line alone. Patterns that use \\A, \\Z, or
+    a lookbehind could match differently in the buffer, so their lines are
+    searched one by one.
+
+    Args:
+      pattern: A compiled bytes pattern, compiled with re.MULTILINE so that ^
+        and $ match at line boundaries.
+      lines: The lines, as a list of bytestrings.
+
+    Yields:
+      (index, line) for each line that contains a match, in order.
+    """
+    search = pattern.search
+    if any(syntax in pattern.pattern for syntax in _WHOLE_BUFFER_SYNTAX):
+        for index, line in enumerate(lines):
+            if search(line) is not None:
+                yield (index, line)
+        return
+
+    text = b''.join(lines)
+    m = search(text)
+    if m is None:
+        return
+    # (The line index is only built once there is a match to place.)
+    line_ends = list(itertools.accumulate(map(len, lines)))
+    pos = 0
+    while m is not None:
+        index = bisect.bisect_right(line_ends, m.start())
+        if index == len(lines):
+            # (An empty match at the end of the text belongs to the last line,
+            # if that line has not been searched yet.)
+            if pos < len(text) and search(lines[-1]) is not None:
+                yield (index - 1, lines[-1])
+            return
+        line = lines[index]
+        if search(line) is not None:
+            yield (index, line)
+        pos = line_ends[index]
+        m = search(text, pos)
+
+
 def luafind(args):
     """Looks for Lua code lines that match a pattern in one or more carts.
 
@@ -378,27 +876,33 @@ def luafind(args):
     Returns:
       0 on success, 1 on failure.
     """
-    # (The first argument is the pattern, but it's stored in args.filename.)
-    filenames = list(args.filename)
-    if len(filenames) < 2:
-        util.error(
-            'Usage: p8tool luafind <pattern> <filename> [<filename>...]\n')
+    # (Lua lines are P8SCII bytestrings, so the pattern is converted to
+    # P8SCII and matched as bytes.)
+    try:
+        pattern = re.compile(lua.unicode_to_p8scii(args.pattern),
+                             re.MULTILINE)
+    except KeyError as e:
+        util.error('pattern has a character that is not in P8SCII: {}\n'
+                   .format(e.args[0]))
         return 1
-    pattern = re.compile(filenames.pop(0))
-
-    # TODO: Tell the Lua class not to bother parsing, since we only need the
-    # token stream to get the lines of code.
-    for fname, g in _games_for_filenames(filenames):
-        line_count = 0
-        for line in g.lua.to_lines():
-            line_count += 1
-            if pattern.search(line) is None:
-                continue
-            if args.listfiles:
+
+    # Only the token stream is needed to get the lines of code.
+    for fname, g in _games_for_filenames(
+            args.filename, parse=False, use_cache=_use_cache(args)):
+        if g is None:
+            util.error('{}: could not load cart\n'.format(fname))
+            continue
+
+        matches = _matching_lines(pattern, list(g.lua.to_lines()))
+        if args.listfiles:
+            if next(matches, None) is not None:
                 util.write(fname + '\n')
-                break
-            util.write('{}:{}:{}'.format(
-                fname, line_count, _as_friendly_string(line)))
+            continue
+
+        prefix = fname + ':'
+        util.write(''.join(
+            prefix + str(index + 1) + ':' + _as_friendly_string(line)
+            for index, line in matches))
 
     return 0
 
@@ -419,207 +923,325 @@ def do_luafmt(args):
                               overwrite=args.overwrite, args=args)
 
 
-def _get_argparser():
-    """Builds and returns the argument parser."""
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        '-q', '--quiet', action='store_true',
-        help='suppresses inessential messages')
-    parser.add_argument(
-        '--debug', action='store_true',
-        help='write extra messages for debugging the tool')
+# The argument parsers, keyed by command, built on first use by
+# _get_argparser().
+_argparsers: Dict[Optional[str], argparse.ArgumentParser] = {}
 
-    subparsers = parser.add_subparsers(
-        title='Commands')
 
-    sp_stats = subparsers.add_parser(
+def _get_argparser(command=None):
+    """Returns the argument parser for a command, building it on first use.
+
+    Args:
+      command: The command name. If this is None or not a known command, the
+        parser includes every command, for help and error messages.
+
+    Returns:
+      The argparse.ArgumentParser.
+    """
+    if command not in _COMMAND_PARSERS:
+        command = None
+    parser = _argparsers.get(command)
+    if parser is None:
+        parser = _build_argparser(command)
+        _argparsers[command] = parser
+    return parser
+
+
+def _command_from_args(orig_args):
+    """Finds the command name in the command line arguments.
+
+    The top-level options take no values, so the command is the first
+    argument that is not an option. A help option before the command asks
+    for the help for every command.
+
+    Args:
+      orig_args: The command line arguments, not including the program name.
+
+    Returns:
+      The command name, or None if there is none.
+    """
+    for arg in orig_args:
+        if arg in ('-h', '--help'):
+            return None
+        if not arg.startswith('-'):
+            return arg
+    return None
+
+
+def _add_stats_parser(subparsers):
+    """Adds the stats command to the argument parser."""
+    sp = subparsers.add_parser(
         'stats',
         help='displays stats about one or more carts')
-    sp_stats.add_argument(
+    sp.add_argument(
         '--csv', action='store_true',
         help='output a CSV file instead of text')
-    sp_stats.add_argument(
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_stats.set_defaults(func=stats)
+        help='the names of carts, or directories of carts, to process')
+    sp.set_defaults(func=stats)
 
-    sp_listlua = subparsers.add_parser(
+
+def _add_listlua_parser(subparsers):
+    """Adds the listlua command to the argument parser."""
+    sp = subparsers.add_parser(
         'listlua',
         help='lists the Lua code for a cart to the console')
-    sp_listlua.add_argument(
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_listlua.add_argument(
+        help='the names of carts, or directories of carts, to process')
+    sp.add_argument(
         '--show-line-numbers', action='store_true',
         help='prepends each line with a line number')
-    sp_listlua.add_argument(
+    sp.add_argument(
         '--pure-lua', action='store_true',
         help='converts PICO-8 syntax extensions to pure Lua')
-    sp_listlua.set_defaults(func=listlua)
+    sp.set_defaults(func=listlua)
+
 
-    sp_listrawlua = subparsers.add_parser(
+def _add_listrawlua_parser(subparsers):
+    """Adds the listrawlua command to the argument parser."""
+    sp = subparsers.add_parser(
         'listrawlua',
         help='lists the Lua code for a cart to the console without parsing it')
-    sp_listrawlua.add_argument(
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_listrawlua.add_argument(
+        help='the names of carts, or directories of carts, to process')
+    sp.add_argument(
         '--show-line-numbers', action='store_true',
         help='prepends each line with a line number')
-    sp_listrawlua.set_defaults(func=listrawlua)
+    sp.set_defaults(func=listrawlua)
 
-    sp_writep8 = subparsers.add_parser(
+
+def _add_writep8_parser(subparsers):
+    """Adds the writep8 command to the argument parser."""
+    sp = subparsers.add_parser(
         'writep8',
         help='converts a .p8.png cart to a .p8 cart')
-    sp_writep8.add_argument(
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_writep8.set_defaults(func=do_writep8)
+        help='the names of carts, or directories of carts, to process')
+    sp.set_defaults(func=do_writep8)
+
 
-    sp_luamin = subparsers.add_parser(
+def _add_luamin_parser(subparsers):
+    """Adds the luamin command to the argument parser."""
+    sp = subparsers.add_parser(
         'luamin',
         help='minifies the Lua code for a cart, reducing the character count')
-    sp_luamin.add_argument(
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_luamin.add_argument(
+        help='the names of carts, or directories of carts, to process')
+    sp.add_argument(
         '--keep-all-names', action='store_true',
         help='preserves all variable, property, and label names')
-    # sp_luamin.add_argument(
+    # sp.add_argument(
     #     '--keep-property-names', action='store_true',
     #     help='preserves property names')
-    sp_luamin.add_argument(
+    sp.add_argument(
         '--keep-names-from-file', type=str, action='store',
         help='preserves names found in the given text file')
-    sp_luamin.set_defaults(func=do_luamin)
+    sp.set_defaults(func=do_luamin)
+
 
-    sp_luafmt = subparsers.add_parser(
+def _add_luafmt_parser(subparsers):
+    """Adds the luafmt command to the argument parser."""
+    sp = subparsers.add_parser(
         'luafmt',
         help='make the Lua code for a cart easier to read by adjusting '
              'indentation')
-    sp_luafmt.add_argument(
+    sp.add_argument(
         '--indentwidth', type=int, action='store', default=2,
         help='for luafmt, the indent width as a number of spaces')
-    sp_luafmt.add_argument(
+    sp.add_argument(
         '--overwrite', action='store_true',
         help='for luafmt, given a filename, overwrites the original file '
         'instead of creating a separate *_fmt.p8 file')
-    sp_luafmt.add_argument(
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_luafmt.set_defaults(func=do_luafmt)
+        help='the names of carts, or directories of carts, to process')
+    sp.set_defaults(func=do_luafmt)
 
-    sp_luafind = subparsers.add_parser(
+
+def _add_luafind_parser(subparsers):
+    """Adds the luafind command to the argument parser."""
+    sp = subparsers.add_parser(
         'luafind',
         help='finds a string or pattern in the code of one or more carts')
-    sp_luafind.add_argument(
+    sp.add_argument(
         '--listfiles', action='store_true',
         help='for luafind, only list filenames, do not print matching lines')
-    sp_luafind.add_argument(
+    sp.add_argument(
+        'pattern', type=str,
+        help='the string or regular expression to find')
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_luafind.set_defaults(func=luafind)
+        help='the names of carts, or directories of carts, to process')
+    sp.set_defaults(func=luafind)
+
 
-    sp_listtokens = subparsers.add_parser(
+def _add_listtokens_parser(subparsers):
+    """Adds the listtokens command to the argument parser."""
+    sp = subparsers.add_parser(
         'listtokens',
         help='lists the tokens for a cart to the console (for debugging '
              'picotool)')
-    sp_listtokens.add_argument(
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_listtokens.set_defaults(func=listtokens)
+        help='the names of carts, or directories of carts, to process')
+    sp.set_defaults(func=listtokens)
 
-    sp_printast = subparsers.add_parser(
+
+def _add_printast_parser(subparsers):
+    """Adds the printast command to the argument parser."""
+    sp = subparsers.add_parser(
         'printast',
         help='prints the picotool parser tree to the console (for debugging '
              'picotool)')
-    sp_printast.add_argument(
+    sp.add_argument(
         'filename', type=str, nargs='+',
-        help='the names of files to process')
-    sp_printast.set_defaults(func=printast)
+        help='the names of carts, or directories of carts, to process')
+    sp.set_defaults(func=printast)
+
 
-    sp_build = subparsers.add_parser(
+def _add_build_parser(subparsers):
+    """Adds the build command to the argument parser."""
+    sp = subparsers.add_parser(
         'build',
         help='builds a cart out of multiple files')
-    sp_build.add_argument(
+    sp.add_argument(
         '--lua', type=str,
         help='filename for the cart (.p8 .p8.png) or Lua source file (.lua) '
              'to use for the lua region')
-    sp_build.add_argument(
+    sp.add_argument(
         '--empty-lua', action='store_true',
         help='use an empty lua region (overrides default)')
-    sp_build.add_argument(
+    sp.add_argument(
         '--lua-path', type=str,
         help='the load path to use with require() statements')
-    sp_build.add_argument(
+    sp.add_argument(
         '--optimize-tokens', action='store_true',
         help='attempt to reduce the number of Lua tokens in the final cart')
-    sp_build.add_argument(
+    sp.add_argument(
         '--lua-format', action='store_true',
         help='clean up Lua formatting in the final cart')
-    sp_build.add_argument(
+    sp.add_argument(
         '--lua-minify', action='store_true',
         help='minify the number of Lua characters in the final cart '
              '(opposite of --lua-format)')
-    sp_build.add_argument(
+    sp.add_argument(
         '--keep-all-names', action='store_true',
         help='when minifying, preserves all variable, property, '
              'and label names')
-    # sp_build.add_argument(
+    # sp.add_argument(
     #     '--keep-property-names', action='store_true',
     #     help='when minifying, preserves property names')
-    sp_build.add_argument(
+    sp.add_argument(
         '--keep-names-from-file', type=str, action='store',
         help='when minifying, preserves names found in the given text file')
-    sp_build.add_argument(
+    sp.add_argument(
         '--gfx', type=str,
         help='filename for the cart whose gfx region to use')
-    sp_build.add_argument(
+    sp.add_argument(
         '--empty-gfx', action='store_true',
         help='use an empty gfx region (overrides default)')
-    sp_build.add_argument(
+    sp.add_argument(
         '--gff', type=str,
         help='filename for the cart whose gff (flags) region to '
              'use')
-    sp_build.add_argument(
+    sp.add_argument(
         '--empty-gff', action='store_true',
         help='use an empty gff (flags) region (overrides default)')
-    sp_build.add_argument(
+    sp.add_argument(
         '--map', type=str,
         help='filename for the cart whose map region to use')
-    sp_build.add_argument(
+    sp.add_argument(
         '--empty-map', action='store_true',
         help='use an empty map region (overrides default)')
-    sp_build.add_argument(
+    sp.add_argument(
         '--sfx', type=str,
         help='filename for the cart whose sfx region to use')
-    sp_build.add_argument(
+    sp.add_argument(
         '--empty-sfx', action='store_true',
         help='use an empty sfx region (overrides default)')
-    sp_build.add_argument(
+    sp.add_argument(
         '--music', type=str,
         help='filename for the cart whose music region to use')
-    sp_build.add_argument(
+    sp.add_argument(
         '--empty-music', action='store_true',
         help='use an empty music region (overrides default)')
-    sp_build.add_argument(
+    sp.add_argument(
         'filename', type=str,
         help='filename of the output cart; if the file exists, '
              'the cart is used as the default input for each region not '
              'overridden')
-    sp_build.set_defaults(func=build.do_build)
+    sp.set_defaults(func=build.do_build)
+
+
+# The functions that add each command to the argument parser, in the order
+# they are listed in help.
+_COMMAND_PARSERS = {
+    'stats': _add_stats_parser,
+    'listlua': _add_listlua_parser,
+    'listrawlua': _add_listrawlua_parser,
+    'writep8': _add_writep8_parser,
+    'luamin': _add_luamin_parser,
+    'luafmt': _add_luafmt_parser,
+    'luafind': _add_luafind_parser,
+    'listtokens': _add_listtokens_parser,
+    'printast': _add_printast_parser,
+    'build': _add_build_parser,
+}
+
+
+def _build_argparser(command=None):
+    """Builds and returns the argument parser.
+
+    Building every command's subparser costs more than parsing the
+    arguments, so a parser for a known command only includes that command.
+
+    Args:
+      command: The command name, or None to include every command.
+
+    Returns:
+      The argparse.ArgumentParser.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-q', '--quiet', action='store_true',
+        help='suppresses inessential messages')
+    parser.add_argument(
+        '--debug', action='store_true',
+        help='write extra messages for debugging the tool')
+    parser.add_argument(
+        '--cache', action='store_true',
+        help='read and store loaded carts in the cart cache, '
+        '$XDG_CACHE_HOME/picotool (default ~/.cache/picotool)')
+
+    subparsers = parser.add_subparsers(
+        title='Commands')
+
+    if command is None:
+        for add_parser in _COMMAND_PARSERS.values():
+            add_parser(subparsers)
+    else:
+        _COMMAND_PARSERS[command](subparsers)
 
     return parser
 
 
 def main(orig_args=None):
     try:
-        arg_parser = _get_argparser()
+        if orig_args is None:
+            orig_args = sys.argv[1:]
+        arg_parser = _get_argparser(_command_from_args(orig_args))
         args = arg_parser.parse_args(args=orig_args)
         if args.debug:
             util.set_verbosity(util.VERBOSITY_DEBUG)
         elif args.quiet:
             util.set_verbosity(util.VERBOSITY_QUIET)
+        if isinstance(getattr(args, 'filename', None), list):
+            args.filename = _expand_cart_dirs(args.filename)
 
         if hasattr(args, 'func'):
             return args.func(args)
@@ -1,5 +1,6 @@
 """Utility classes and functions for the picotool tools and libraries."""
 
+import binascii
 import sys
 
 __all__ = [
@@ -78,6 +79,10 @@ def error(msg):
     _error_stream.write(msg)
 
 
+# The whitespace characters deleted from .p8 hex sections before decoding.
+_HEX_WHITESPACE = b' \t\r\n'
+
+
 class BaseSection():
     """A base class for PICO-8 section objects."""
 
@@ -103,8 +108,10 @@ class BaseSection():
           lines: .p8 lines for the section.
           version: The PICO-8 data version from the game file header.
         """
-        data = b''.join(bytearray.fromhex(
-            str(line.rstrip(), encoding='ascii')) for line in lines)
+        # (The whole section is decoded with one call. Whitespace, including
+        # each line's newline, is deleted first.)
+        data = binascii.unhexlify(
+            b''.join(lines).translate(None, _HEX_WHITESPACE))
         return cls(data=data, version=version)
 
     HEX_LINE_LENGTH_BYTES = 64
@@ -115,12 +122,11 @@ class BaseSection():
         Yields:
           One line of a hex string.
         """
-        for start_i in range(0, len(self._data), self.HEX_LINE_LENGTH_BYTES):
-            end_i = start_i + self.HEX_LINE_LENGTH_BYTES
-            if end_i > len(self._data):
-                end_i = len(self._data)
-            yield bytes(bytes_to_hex(bytes(self._data[start_i:end_i])),
-                        encoding='ascii') + b'\n'
+        # (The whole section is encoded with one call, then split into lines.)
+        hexdata = binascii.hexlify(self._data)
+        line_len = self.HEX_LINE_LENGTH_BYTES * 2
+        for start_i in range(0, len(hexdata), line_len):
+            yield hexdata[start_i:start_i + line_len] + b'\n'
 
     @classmethod
     def from_bytes(cls, data, version):
@@ -133,22 +139,3 @@ class BaseSection():
 
     def to_bytes(self):
         return self._data
-
-
-def bytes_to_hex(bstr):
-    """Convert a bytestring to a text string of hexadecimal digits.
-
-    This exists solely to support Python 3.4 for Cygwin users.
-    bytes(...).hex() was added in Python 3.5.
-
-    Note that most callers of this function need to encode the text string
-    back into a bytestring of ASCII characters. This function does not do that
-    to remain equivalent to bytes(...).hex().
-
-    Args:
-        bstr: The bytestring.
-
-    Returns:
-        The text string of hexadecimal digits.
-    """
-    return ''.join(format(b, '02x') for b in bstr)
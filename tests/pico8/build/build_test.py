@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+import io
 import os
 import shutil
 import tempfile
@@ -10,19 +11,63 @@ from unittest.mock import patch
 
 from pico8.build import build
 from pico8.game import game
+from pico8.game.formatter.p8 import P8Formatter
 from pico8.lua import lexer
 from pico8.lua import lua
 
 
+def _make_tempdir():
+    """Makes a temporary directory, in RAM-backed storage when available.
+
+    The PICOTOOL_TEST_TMPFS environment variable names the parent directory
+    to use. Otherwise /dev/shm is used if it exists, falling back to the
+    system default.
+    """
+    parent = os.environ.get('PICOTOOL_TEST_TMPFS')
+    if (parent is None and os.path.isdir('/dev/shm') and
+            os.access('/dev/shm', os.W_OK)):
+        parent = '/dev/shm'
+    return tempfile.mkdtemp(dir=parent)
+
+
+def _p8_bytes(cart, filename):
+    """Serializes a game as .p8 file contents."""
+    outfh = io.BytesIO()
+    P8Formatter.to_file(cart, outfh, filename=filename)
+    return outfh.getvalue()
+
+
 class TestDoBuild(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Each test gets its own directory under one class-level tempdir.
+        # The carts that more than one test starts from are serialized once.
+        cls.root_tempdir = _make_tempdir()
+
+        sprite_cart = game.Game.make_empty_game('foo.p8')
+        sprite_cart.gfx.set_sprite(0, [[1, 0, 1], [0, 1, 0], [1, 0, 1]])
+        sprite_cart.gff.set_flags(0, 7)
+        cls.sprite_p8_bytes = _p8_bytes(sprite_cart, 'foo.p8')
+
+        lua_cart = game.Game.make_empty_game('foo.p8')
+        lua_cart.lua = lua.Lua.from_lines([b'print("zzz")'], version=8)
+        cls.lua_p8_bytes = _p8_bytes(lua_cart, 'foo.p8')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root_tempdir)
+
     def setUp(self):
-        self.tempdir = tempfile.mkdtemp()
+        self.tempdir = tempfile.mkdtemp(dir=self.root_tempdir)
         self.cwd = os.getcwd()
         os.chdir(self.tempdir)
 
     def tearDown(self):
         os.chdir(self.cwd)
-        shutil.rmtree(self.tempdir)
+
+    def write_file(self, filename, data):
+        with open(filename, 'wb') as outfh:
+            outfh.write(data)
 
     def testErrorOutputFilenameHasWrongExtension(self):
         args = argparse.Namespace(filename='foo.xxx')
@@ -54,11 +99,7 @@ class TestDoBuild(unittest.TestCase):
             self.assertIn(b'__gfx__\n00000000', txt)
 
     def testBuildOverwritesExisting(self):
-        output_cart = game.Game.make_empty_game('foo.p8')
-        output_cart.gfx.set_sprite(0, [[1, 0, 1], [0, 1, 0], [1, 0, 1]])
-        output_cart.gff.set_flags(0, 7)
-        with open('foo.p8', 'wb') as outfh:
-            output_cart.to_p8_file(outfh, filename='foo.p8')
+        self.write_file('foo.p8', self.sprite_p8_bytes)
         with open('foo.p8', 'rb') as infh:
             txt = infh.read()
             self.assertIn(b'__gfx__\n10100000', txt)
@@ -66,8 +107,7 @@ class TestDoBuild(unittest.TestCase):
 
         input_cart = game.Game.make_empty_game('in.p8')
         input_cart.gfx.set_sprite(0, [[2, 0, 2], [0, 2, 0], [2, 0, 2]])
-        with open('in.p8', 'wb') as outfh:
-            input_cart.to_p8_file(outfh, filename='in.p8')
+        self.write_file('in.p8', _p8_bytes(input_cart, 'in.p8'))
         args = argparse.Namespace(gfx='in.p8', filename='foo.p8')
         self.assertEqual(0, build.do_build(args))
         with open('foo.p8', 'rb') as infh:
@@ -76,18 +116,14 @@ class TestDoBuild(unittest.TestCase):
             self.assertIn(b'__gff__\n07000000', txt)
 
     def testBuildLuaFromP8(self):
-        output_cart = game.Game.make_empty_game('foo.p8')
-        output_cart.lua = lua.Lua.from_lines([b'print("zzz")'], version=8)
-        with open('foo.p8', 'wb') as outfh:
-            output_cart.to_p8_file(outfh, filename='foo.p8')
+        self.write_file('foo.p8', self.lua_p8_bytes)
         with open('foo.p8', 'rb') as infh:
             txt = infh.read()
             self.assertIn(b'__lua__\nprint("zzz")\n', txt)
 
         input_cart = game.Game.make_empty_game('in.p8')
         input_cart.lua = lua.Lua.from_lines([b'print("hi")'], version=8)
-        with open('in.p8', 'wb') as outfh:
-            input_cart.to_p8_file(outfh, filename='in.p8')
+        self.write_file('in.p8', _p8_bytes(input_cart, 'in.p8'))
         args = argparse.Namespace(lua='in.p8', filename='foo.p8')
         self.assertEqual(0, build.do_build(args))
         with open('foo.p8', 'rb') as infh:
@@ -95,10 +131,7 @@ class TestDoBuild(unittest.TestCase):
             self.assertIn(b'__lua__\nprint("hi")\n', txt)
 
     def testBuildLuaFromLuaFile(self):
-        output_cart = game.Game.make_empty_game('foo.p8')
-        output_cart.lua = lua.Lua.from_lines([b'print("zzz")'], version=8)
-        with open('foo.p8', 'wb') as outfh:
-            output_cart.to_p8_file(outfh, filename='foo.p8')
+        self.write_file('foo.p8', self.lua_p8_bytes)
         with open('foo.p8', 'rb') as infh:
             txt = infh.read()
             self.assertIn(b'__lua__\nprint("zzz")\n', txt)
@@ -112,11 +145,7 @@ class TestDoBuild(unittest.TestCase):
             self.assertIn(b'__lua__\nprint("hi")\n', txt)
 
     def testBuildEmptiesSection(self):
-        output_cart = game.Game.make_empty_game('foo.p8')
-        output_cart.gfx.set_sprite(0, [[1, 0, 1], [0, 1, 0], [1, 0, 1]])
-        output_cart.gff.set_flags(0, 7)
-        with open('foo.p8', 'wb') as outfh:
-            output_cart.to_p8_file(outfh, filename='foo.p8')
+        self.write_file('foo.p8', self.sprite_p8_bytes)
         with open('foo.p8', 'rb') as infh:
             txt = infh.read()
             self.assertIn(b'__gfx__\n10100000', txt)
@@ -243,25 +272,28 @@ class TestRequireWalker(unittest.TestCase):
 
 
 class TestEvaluateRequire(unittest.TestCase):
-    def setUp(self):
-        self.tempdir = tempfile.mkdtemp()
-        os.makedirs(os.path.join(self.tempdir, 'bar'))
-        self.file_path = os.path.join(self.tempdir, 'bar', 'foo.lua')
-
-        self.lib1_file_path = os.path.join(self.tempdir, 'bar', 'lib1.lua')
-        with open(self.lib1_file_path, 'wb') as outfh:
+    @classmethod
+    def setUpClass(cls):
+        # (The tests only read these files, so they are written once.)
+        cls.tempdir = _make_tempdir()
+        os.makedirs(os.path.join(cls.tempdir, 'bar'))
+        cls.file_path = os.path.join(cls.tempdir, 'bar', 'foo.lua')
+
+        cls.lib1_file_path = os.path.join(cls.tempdir, 'bar', 'lib1.lua')
+        with open(cls.lib1_file_path, 'wb') as outfh:
             outfh.write(b'x=1\nreturn 111\n')
 
-        self.lib2_file_path = os.path.join(self.tempdir, 'bar', 'lib2.lua')
-        with open(self.lib2_file_path, 'wb') as outfh:
+        cls.lib2_file_path = os.path.join(cls.tempdir, 'bar', 'lib2.lua')
+        with open(cls.lib2_file_path, 'wb') as outfh:
             outfh.write(b'require("lib1")\nx=2\nreturn 222\n')
 
-        self.lib3_file_path = os.path.join(self.tempdir, 'bar', 'lib3.lua')
-        with open(self.lib3_file_path, 'wb') as outfh:
+        cls.lib3_file_path = os.path.join(cls.tempdir, 'bar', 'lib3.lua')
+        with open(cls.lib3_file_path, 'wb') as outfh:
             outfh.write(b'x=3\nfunction _update60() end\nfunction _draw() end\n')
 
-    def tearDown(self):
-        shutil.rmtree(self.tempdir)
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempdir)
 
     def testRequiresFile(self):
         ast = lua.Lua.from_lines([b'require("lib1")\n'], 8)
@@ -4,6 +4,7 @@ import io
 import os
 import png
 import shutil
+import stat
 import tempfile
 import unittest
 
@@ -459,6 +460,14 @@ class TestFile(unittest.TestCase):
         self.assertEqual(4, g.sfx._version)
         self.assertEqual(4, g.music._version)
 
+    def testFromBytes(self):
+        g = file.from_bytes(
+            VALID_P8_HEADER + VALID_P8_LUA_SECTION_HEADER + VALID_P8_FOOTER,
+            'test.p8')
+        self.assertEqual('test.p8', g.filename)
+        self.assertEqual(4, g.lua._version)
+        self.assertIsNotNone(g.lua.root)
+
     def testToFile(self):
         g = p8.P8Formatter.from_file(io.BytesIO(
             VALID_P8_HEADER +
@@ -474,6 +483,39 @@ class TestFile(unittest.TestCase):
         self.assertEqual(4, tg.map._version)
         self.assertEqual(4, tg.sfx._version)
         self.assertEqual(4, tg.music._version)
+        self.assertEqual(['test.p8'], os.listdir(self.tempdir))
+
+    def testToFileErrorKeepsOriginal(self):
+        test_p8_path = os.path.join(self.tempdir, 'test.p8')
+        with open(test_p8_path, 'wb') as fh:
+            fh.write(b'original')
+        self.assertRaises(AttributeError, file.to_file, None, test_p8_path)
+        with open(test_p8_path, 'rb') as fh:
+            self.assertEqual(b'original', fh.read())
+        self.assertEqual(['test.p8'], os.listdir(self.tempdir))
+
+    def testToFileKeepsUnrelatedTmpFile(self):
+        test_p8_path = os.path.join(self.tempdir, 'test.p8')
+        with open(test_p8_path + '.tmp', 'wb') as fh:
+            fh.write(b'notes')
+        file.to_file(game.Game.make_empty_game(), test_p8_path)
+        self.assertRaises(AttributeError, file.to_file, None, test_p8_path)
+        with open(test_p8_path + '.tmp', 'rb') as fh:
+            self.assertEqual(b'notes', fh.read())
+        self.assertEqual(['test.p8', 'test.p8.tmp'],
+                         sorted(os.listdir(self.tempdir)))
+
+    def testToFileKeepsModeAndSymlink(self):
+        real_path = os.path.join(self.tempdir, 'real.p8')
+        link_path = os.path.join(self.tempdir, 'link.p8')
+        file.to_file(game.Game.make_empty_game(), real_path)
+        os.chmod(real_path, 0o640)
+        os.symlink(real_path, link_path)
+        file.to_file(game.Game.make_empty_game(), link_path)
+        self.assertTrue(os.path.islink(link_path))
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(real_path).st_mode))
+        self.assertEqual(['link.p8', 'real.p8'],
+                         sorted(os.listdir(self.tempdir)))
 
 
 class TestP8Include(unittest.TestCase):
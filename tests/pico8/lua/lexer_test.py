@@ -189,6 +189,15 @@ class TestLexer(unittest.TestCase):
         self.assertFalse(lxr._tokens[0].matches(lexer.TokKeyword(b'and')))
         self.assertFalse(lxr._tokens[0].matches(lexer.TokSpace))
 
+    def testPatternTokensAreShared(self):
+        self.assertIs(lexer.TokSymbol(b','), lexer.TokSymbol(b','))
+        self.assertIs(lexer.TokKeyword(b'end'), lexer.TokKeyword(b'end'))
+        self.assertIsNot(lexer.TokSymbol(b','), lexer.TokSymbol(b';'))
+        tok = lexer.TokSymbol(b',', 1, 2)
+        self.assertIsNot(lexer.TokSymbol(b','), tok)
+        self.assertEqual(1, tok._lineno)
+        self.assertTrue(tok.matches(lexer.TokSymbol(b',')))
+
     def testWhitespace(self):
         lxr = lexer.Lexer(version=4)
         lxr._process_line(b'    \n')
@@ -109,6 +109,20 @@ class TestUnicodeConversion(unittest.TestCase):
             HIGH_CHARS_P8SCII,
             lua.unicode_to_p8scii(HIGH_CHARS_UNICODE))
 
+    def testRoundTripAllP8SCII(self):
+        all_p8scii = bytes(range(256))
+        all_unicode = ''.join(c.p8string for c in lua.P8SCII_CHARSET)
+        self.assertEqual(all_unicode, lua.p8scii_to_unicode(all_p8scii))
+        self.assertEqual(all_p8scii, lua.unicode_to_p8scii(all_unicode))
+
+    def testUnicodeToP8SCIIAscii(self):
+        self.assertEqual(b'x = 1 -- hi\n',
+                         lua.unicode_to_p8scii('x = 1 -- hi\n'))
+
+    def testUnicodeToP8SCIINotInCharset(self):
+        for s in ('\x10', '\xe9', '\u65e5', '\u2b07y', '\ufe0f'):
+            self.assertRaises(KeyError, lua.unicode_to_p8scii, s)
+
 
 class TestLua(unittest.TestCase):
     def testInit(self):
@@ -120,6 +134,12 @@ class TestLua(unittest.TestCase):
         result = lua.Lua.from_lines(VALID_LUA_SHORT_LINES, 4)
         self.assertEqual(17, len(result._lexer._tokens))
 
+    def testFromLinesNoParse(self):
+        result = lua.Lua.from_lines([b'if then\n'], 4, parse=False)
+        self.assertEqual(4, len(result.tokens))
+        self.assertIsNone(result.root)
+        self.assertEqual([b'if then\n'], list(result.to_lines()))
+
     def testGetCharCount(self):
         result = lua.Lua.from_lines(VALID_LUA_SHORT_LINES, 4)
         self.assertEqual(sum(len(line) for line in VALID_LUA_SHORT_LINES),
@@ -137,6 +157,33 @@ class TestLua(unittest.TestCase):
         ], 4)
         self.assertEqual(5, result.get_token_count())
 
+    def testGetTokenCountUncountedAndExponents(self):
+        result = lua.Lua.from_lines([
+            b'local x = 1e3\n',
+            b'a:b(c.d)[1] {}\n',
+            b'end -- hi\n'
+        ], 4)
+        self.assertEqual(12, result.get_token_count())
+
+    def testGetLineCount(self):
+        result = lua.Lua.from_lines(VALID_LUA_SHORT_LINES, 4)
+        self.assertEqual(5, result.get_line_count())
+
+    def testGetCounts(self):
+        result = lua.Lua.from_lines([
+            b'local x = 1e3\n',
+            b'a:b(c.d)[1] {"a\\nb"}\n',
+            b'end -- hi\n'
+        ], 4)
+        self.assertEqual((45, 13, 3), result.get_counts())
+
+    def testGetCountsAfterUpdate(self):
+        result = lua.Lua.from_lines([b'x = 1\n'], 4)
+        self.assertEqual((6, 3, 1), result.get_counts())
+        result.update_from_lines([b'y = 22\n'])
+        self.assertEqual((13, 6, 2), result.get_counts())
+        self.assertEqual(13, result.get_char_count())
+
     def testGetTitle(self):
         result = lua.Lua.from_lines(VALID_LUA_SHORT_LINES, 4)
         self.assertEqual(b'short test', result.get_title())
@@ -145,6 +192,19 @@ class TestLua(unittest.TestCase):
         result = lua.Lua.from_lines(VALID_LUA_SHORT_LINES, 4)
         self.assertEqual(b'by dan', result.get_byline())
 
+    def testGetStats(self):
+        result = lua.Lua.from_lines(VALID_LUA_SHORT_LINES, 4)
+        stats = result.get_stats()
+        self.assertEqual(
+            (result.get_title(), result.get_byline(), 4) +
+            result.get_counts(), stats)
+        self.assertEqual(result.get_token_count(), stats.token_count)
+
+    def testGetStatsNoTitle(self):
+        stats = lua.Lua.from_lines([b'x = 1\n'], 8).get_stats()
+        self.assertEqual(
+            lua.LuaStats(None, None, 8, 6, 3, 1), stats)
+
     def testBaseLuaWriterNotYetImplemented(self):
         # coverage
         self.assertRaises(NotImplementedError,
@@ -226,6 +226,14 @@ class TestParser(unittest.TestCase):
         self.assertIsNotNone(node)
         self.assertTrue(isinstance(node, parser.VarargDots))
 
+    def testExpValueDotsReusedOnReparse(self):
+        p = get_parser(b'...')
+        node = p._exp()
+        p._pos = 0
+        self.assertIs(node, p._exp())
+        self.assertEqual(0, node.start_pos)
+        self.assertEqual(1, node.end_pos)
+
     def testExpValueErr(self):
         p = get_parser(b'break')
         node = p._exp()
@@ -532,6 +540,14 @@ class TestParser(unittest.TestCase):
         self.assertTrue(isinstance(node, parser.FieldExp))
         self.assertEqual(b'foo', node.exp.value.name.value)
 
+    def testFieldExpNameComparison(self):
+        p = get_parser(b'foo == 3')
+        node = p._field()
+        self.assertIsNotNone(node)
+        self.assertEqual(5, p._pos)
+        self.assertTrue(isinstance(node, parser.FieldExp))
+        self.assertTrue(isinstance(node.exp, parser.ExpBinOp))
+
     def testTableConstructor(self):
         p = get_parser(b'{[1]=2,foo=3;4}')
         node = p._tableconstructor()
@@ -753,6 +769,12 @@ class TestParser(unittest.TestCase):
         self.assertTrue(node.functioncall.args.explist.exps[1].value.matches(lexer.TokNumber(b'2')))
         self.assertTrue(node.functioncall.args.explist.exps[2].value.matches(lexer.TokNumber(b'3')))
 
+    def testStatNotAStat(self):
+        p = get_parser(b'  end')
+        node = p._stat()
+        self.assertIsNone(node)
+        self.assertEqual(0, p._pos)
+
     def testStatDo(self):
         p = get_parser(b'do break end')
         node = p._stat()
@@ -9,6 +9,16 @@ from pico8.map import map
 
 
 class TestMap(unittest.TestCase):
+    def testFromLinesDecodesOnAccess(self):
+        lines = ([b'00010203' + b'00' * 124 + b'\n'] +
+                 [b'00' * 128 + b'\n'] * 31)
+        m = map.Map.from_lines(lines, version=4)
+        self.assertIsNotNone(m._hex_lines)
+        self.assertEqual(3, m.get_cell(3, 0))
+        self.assertIsNone(m._hex_lines)
+        self.assertEqual(4096, len(m.to_bytes()))
+        self.assertEqual(lines, list(m.to_lines()))
+
     def testGetCell(self):
         m = map.Map.empty()
         m._data[0:128] = (b'\x00\x01\x02\x03\x04\x05\x06\x07'
@@ -92,7 +102,19 @@ class TestMap(unittest.TestCase):
              bytearray(b'\x00\x00\x01\x01\x01\x01\x00'),
              bytearray(b'\x00\x00\x01\x01\x01\x01\x00'),
              bytearray(b'\x00\x00\x00\x00\x00\x00\x00')], result)
-        
+
+    def testSetRectTilesOffEdge(self):
+        m = map.Map.empty()
+        m._gfx = gfx.Gfx.empty()
+        m.set_rect_tiles([[1, 2, 3]] * 4, 126, 31)
+        self.assertEqual(
+            [bytearray(b'\x00\x01\x02'),
+             bytearray(b'\x00\x01\x02')],
+            m.get_rect_tiles(125, 31, width=3, height=2))
+        self.assertEqual(2, m._gfx._data[4096 + 127])
+        self.assertEqual(2, m.get_cell(127, 34))
+        self.assertEqual(0, m.get_cell(0, 35))
+
     def testGetRectPixels(self):
         m = map.Map.empty()
         m._gfx = gfx.Gfx.empty()
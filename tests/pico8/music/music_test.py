@@ -16,10 +16,27 @@ class TestMusic(unittest.TestCase):
         self.assertEqual(b'\x41\x42\x43\x44' * 64, m._data)
         self.assertEqual(4, m._version)
         
+    def testFromBuffer(self):
+        m = music.Music.from_buffer(b'07 01020304\n' + b'00 41424344\n', 4)
+        self.assertEqual(b'\x81\x82\x83\x04\x41\x42\x43\x44', m._data)
+
+    def testFromLinesFlags(self):
+        m = music.Music.from_lines(
+            [b'01 01020304\n', b'02 01020304\n', b'07 01020304\n'], 4)
+        self.assertEqual(b'\x81\x02\x03\x04'
+                         b'\x01\x82\x03\x04'
+                         b'\x81\x82\x83\x04', m._data)
+        self.assertEqual((True, True, True), m.get_properties(2))
+
     def testToLines(self):
         m = music.Music.from_lines(VALID_MUSIC_LINES, 4)
         self.assertEqual(list(m.to_lines()), VALID_MUSIC_LINES)
 
+    def testToLinesFlags(self):
+        lines = [b'01 01020304\n', b'06 41424344\n', b'07 3f3e3d3c\n']
+        m = music.Music.from_lines(lines, 4)
+        self.assertEqual(lines, list(m.to_lines()))
+
     def testSetChannel(self):
         m = music.Music.empty(version=4)
         m.set_channel(0, 0, 0)
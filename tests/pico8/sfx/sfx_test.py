@@ -29,10 +29,62 @@ class TestSfx(unittest.TestCase):
         self.assertEqual(bytes.fromhex('01100000d83e2451'), s._data[64:72])
         self.assertEqual(4, s._version)
 
+    def testFromLinesWaveformBits(self):
+        # Waveforms 4-7 set the MSB's low bit and must not lose bit 1.
+        line = (b'01100000' + b''.join(b'%02x%x75' % (i, i % 8)
+                                       for i in range(32)) + b'\n')
+        s = sfx.Sfx.from_lines([line], 4)
+        for i in range(32):
+            self.assertEqual((i, i % 8, 7, 5), s.get_note(0, i))
+        self.assertEqual(line, list(s.to_lines())[0])
+
+    def testFromBuffer(self):
+        s = sfx.Sfx.from_buffer(memoryview(b''.join(VALID_SFX_LINES)), 4)
+        self.assertEqual(
+            sfx.Sfx.from_lines(VALID_SFX_LINES, 4)._data, s._data)
+
+    def testFromBufferDecodesOnFirstUse(self):
+        s = sfx.Sfx.from_buffer(b''.join(VALID_SFX_LINES), 4)
+        self.assertIsNotNone(s._nibbles)
+        s.set_note(0, 2, pitch=0)
+        self.assertIsNone(s._nibbles)
+        self.assertEqual((0, 4, 7, 2), s.get_note(0, 0))
+        self.assertEqual((0, 3, 4, 0), s.get_note(0, 2))
+        self.assertEqual(VALID_SFX_LINES[1:], list(s.to_lines())[1:])
+
+    def testSetDataDiscardsUndecodedSection(self):
+        s = sfx.Sfx.from_buffer(b''.join(VALID_SFX_LINES), 4)
+        s._data = bytearray(sfx._EMPTY_DATA)
+        self.assertEqual(list(sfx.Sfx.empty(4).to_lines()),
+                         list(s.to_lines()))
+
+    def testFromBufferMalformed(self):
+        buf = bytearray(b''.join(VALID_SFX_LINES))
+        buf[168] = ord('0')
+        with self.assertRaises(ValueError):
+            sfx.Sfx.from_buffer(buf, 4)
+
     def testToLines(self):
         s = sfx.Sfx.from_lines(VALID_SFX_LINES, 4)
         self.assertEqual(list(s.to_lines()), VALID_SFX_LINES)
 
+    def testFromLinesHighWaveform(self):
+        line = b'01100000' + b'3ff77' + b'0c877' + b'00000' * 30 + b'\n'
+        s = sfx.Sfx.from_lines([line], 4)
+        self.assertEqual((63, 15, 7, 7), s.get_note(0, 0))
+        self.assertEqual((12, 8, 7, 7), s.get_note(0, 1))
+        self.assertEqual(line, list(s.to_lines())[0])
+
+    def testEmpty(self):
+        s = sfx.Sfx.empty(version=4)
+        self.assertEqual(4352, len(s._data))
+        self.assertEqual((0, 1, 0, 0), s.get_properties(0))
+        for id in range(1, 64):
+            self.assertEqual((0, 16, 0, 0), s.get_properties(id))
+        self.assertEqual((0, 0, 0, 0), s.get_note(63, 31))
+        s.set_note(0, 0, pitch=1)
+        self.assertEqual((0, 0, 0, 0), sfx.Sfx.empty(version=4).get_note(0, 0))
+
     def testSetNote(self):
         s = sfx.Sfx.empty(version=4)
         s.set_note(0, 0, pitch=1, waveform=2, volume=3, effect=4)
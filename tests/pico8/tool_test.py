@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import io
+import os
+import re
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pico8 import tool
+from pico8 import util
+
+
+TESTDATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'testdata')
+
+
+class TestAsFriendlyString(unittest.TestCase):
+    def testNone(self):
+        self.assertIsNone(tool._as_friendly_string(None))
+
+    def testAscii(self):
+        self.assertEqual('print("hi")\n',
+                         tool._as_friendly_string(b'print("hi")\n'))
+
+    def testHighCharacters(self):
+        self.assertEqual('_a_b_\x7f',
+                         tool._as_friendly_string(b'\x80a\x99b\xff\x7f'))
+
+    def testByteArray(self):
+        self.assertEqual('a_b',
+                         tool._as_friendly_string(bytearray(b'a\xffb')))
+        self.assertEqual('ab', tool._as_friendly_string(bytearray(b'ab')))
+
+
+class TestGamesForFilenames(unittest.TestCase):
+    def setUp(self):
+        self.fnames = [os.path.join(TESTDATA_PATH, 'test_gol.p8'),
+                       'notes.txt',
+                       os.path.join(TESTDATA_PATH, 'missing.p8'),
+                       os.path.join(TESTDATA_PATH, 'test_cart.p8.png')]
+
+    def load(self, cpu_count):
+        err = io.StringIO()
+        with patch.object(util, '_error_stream', err):
+            with patch('os.cpu_count', return_value=cpu_count):
+                results = [(fname, g is not None and g.lua.get_title())
+                           for fname, g in tool._games_for_filenames(
+                               self.fnames, parse=False)]
+        return results, err.getvalue()
+
+    def testInProcess(self):
+        results, err = self.load(1)
+        self.assertEqual([(self.fnames[0], b'game of life: v1'),
+                          (self.fnames[2], False),
+                          (self.fnames[3], None)], results)
+        self.assertIn('notes.txt: filename must end in', err)
+        self.assertIn(self.fnames[2] + ': ', err)
+
+    def testWorkerProcesses(self):
+        self.assertEqual(self.load(1), self.load(2))
+
+    def testPoolStopsEarly(self):
+        executor = FirstCallExecutor()
+        results = tool._load_games_in_pool(
+            executor, [self.fnames[0]] * 10, 2, parse=False)
+        g, _, _ = next(results)
+        self.assertEqual(b'game of life: v1', g.lua.get_title())
+        results.close()
+        # (Two carts were submitted ahead, then one more after the first
+        # result. The ones that had not run were cancelled.)
+        self.assertEqual(3, len(executor.futures))
+        self.assertTrue(all(f.cancelled() for f in executor.futures[1:]))
+
+
+class FirstCallExecutor():
+    """An executor that runs only the first submitted call."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        if not self.futures:
+            future.set_result(fn(*args))
+        self.futures.append(future)
+        return future
+
+
+class TestListTokens(unittest.TestCase):
+    def setUp(self):
+        self.fname = os.path.join(TESTDATA_PATH, 'test_cart.p8')
+
+    def run_tool(self, args):
+        out = io.StringIO()
+        with patch.object(util, '_write_stream', out):
+            self.assertEqual(0, tool.main(['listtokens'] + args))
+        return out.getvalue()
+
+    def testOneFile(self):
+        self.assertEqual(
+            "<0:b'print'><1:b'('><2:b'0.1.10c'><3:b')'>\n\n\n",
+            self.run_tool([self.fname]))
+
+    def testSpaceAndCommentsAreNotNumbered(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            fname = os.path.join(tempdir, 'comments.p8')
+            with open(fname, 'w', encoding='utf-8') as fh:
+                fh.write('pico-8 cartridge // http://www.pico-8.com\n'
+                         'version 8\n__lua__\n'
+                         '-- hi\nx = 1 -- one\n')
+            self.assertEqual(
+                "<b'-- hi'>\n<0:b'x'><b' '><1:b'='><b' '><2:1.0><b' '>"
+                "<b'-- one'>\n\n",
+                self.run_tool([fname]))
+
+    def testHeadersForMultipleFiles(self):
+        self.assertEqual(
+            2, self.run_tool([self.fname, self.fname]).count(
+                '=== ' + self.fname + ' ===\n'))
+
+
+class TestOutFname(unittest.TestCase):
+    def testP8(self):
+        self.assertEqual('dir/cart_fmt.p8',
+                         tool._out_fname('dir/cart.p8', False))
+
+    def testP8Overwrite(self):
+        self.assertEqual('dir/cart.p8', tool._out_fname('dir/cart.p8', True))
+
+    def testP8Png(self):
+        self.assertEqual('cart.p8_fmt.p8.png',
+                         tool._out_fname('cart.p8.p8.png', False))
+        self.assertEqual('cart_fmt.p8.png',
+                         tool._out_fname('cart.p8.png', True))
+
+
+class TestExpandCartDirs(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dir = self.tempdir.name
+        for name in ('b.p8', 'a.p8.png', 'notes.txt'):
+            with open(os.path.join(self.dir, name), 'wb'):
+                pass
+        os.mkdir(os.path.join(self.dir, 'sub.p8'))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def testExpandsDirectory(self):
+        self.assertEqual(
+            ['x.p8', os.path.join(self.dir, 'a.p8.png'),
+             os.path.join(self.dir, 'b.p8'), 'y.txt'],
+            tool._expand_cart_dirs(['x.p8', self.dir, 'y.txt']))
+
+    def testCartNamedDirectoryIsNotExpanded(self):
+        subdir = os.path.join(self.dir, 'sub.p8')
+        self.assertEqual([subdir], tool._expand_cart_dirs([subdir]))
+
+    def testMainExpandsDirectory(self):
+        with patch('sys.stdout', new_callable=io.StringIO) as out:
+            self.assertEqual(0, tool.main(
+                ['stats', '--csv', TESTDATA_PATH]))
+        names = [line.split(',', 1)[0]
+                 for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual(sorted(n for n in os.listdir(TESTDATA_PATH)
+                                if n.endswith(('.p8', '.p8.png'))), names)
+
+
+class TestMatchingLines(unittest.TestCase):
+    LINES = [b'function foo()\n', b'  print(1)\n', b'end\n', b'print(2)']
+
+    def matches(self, pattern):
+        return list(tool._matching_lines(
+            re.compile(pattern, re.MULTILINE), self.LINES))
+
+    def testNoMatch(self):
+        self.assertEqual([], self.matches(b'zzz'))
+
+    def testMatches(self):
+        self.assertEqual([(1, self.LINES[1]), (3, self.LINES[3])],
+                         self.matches(b'print'))
+
+    def testMatchDoesNotSpanLines(self):
+        self.assertEqual([], self.matches(b'\\)\\s+print'))
+        self.assertEqual([(2, self.LINES[2])], self.matches(b'^end$'))
+
+    def testEmptyMatchAtEnd(self):
+        self.assertEqual(4, len(self.matches(b'$')))
+
+    def testLookbehindDoesNotSeePreviousLine(self):
+        self.assertEqual([], self.matches(b'(?<=\\n)print'))
+        self.assertEqual([(2, self.LINES[2])], self.matches(b'(?<!\\n)end'))
+        self.assertEqual([(3, self.LINES[3])], self.matches(b'(?<!\\s)print'))
+
+    def testLookaheadDoesNotSeeNextLine(self):
+        self.assertEqual([], self.matches(b'\\)(?=\\s+end)'))
+
+    def testStringAnchorsMatchEachLine(self):
+        self.assertEqual([(3, self.LINES[3])], self.matches(b'\\Aprint'))
+        self.assertEqual([(2, self.LINES[2])], self.matches(b'd\\n?\\Z'))
+
+
+class TestArgParser(unittest.TestCase):
+    def testCommandFromArgs(self):
+        self.assertEqual('stats', tool._command_from_args(
+            ['-q', 'stats', 'a.p8']))
+        self.assertIsNone(tool._command_from_args(['--debug']))
+        self.assertIsNone(tool._command_from_args(['-h', 'stats']))
+        self.assertEqual('stats', tool._command_from_args(['stats', '-h']))
+
+    def testCommandParserOnlyHasCommand(self):
+        parser = tool._get_argparser('luafind')
+        args = parser.parse_args(['--cache', 'luafind', '--listfiles',
+                                  'pat', 'a.p8', 'b.p8'])
+        self.assertEqual(tool.luafind, args.func)
+        self.assertTrue(args.cache)
+        self.assertTrue(args.listfiles)
+        self.assertEqual('pat', args.pattern)
+        self.assertEqual(['a.p8', 'b.p8'], args.filename)
+        self.assertNotIn('stats', parser.format_usage())
+
+    def testMainReusesParsers(self):
+        fname = os.path.join(TESTDATA_PATH, 'test_cart.p8')
+        build = tool._build_argparser
+        with patch.object(tool, '_argparsers', {}):
+            with patch.object(tool, '_build_argparser',
+                              side_effect=build) as build_mock:
+                with patch.object(util, '_write_stream', io.StringIO()):
+                    for _ in range(3):
+                        self.assertEqual(0, tool.main(
+                            ['stats', fname]))
+        self.assertEqual(1, build_mock.call_count)
+
+    def testUnknownCommandGetsFullParser(self):
+        parser = tool._get_argparser('bogus')
+        self.assertIs(tool._get_argparser(None), parser)
+        for command in tool._COMMAND_PARSERS:
+            self.assertIn(command, parser.format_help())
+
+
+class TestAsciiOutput(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        with open(os.path.join(TESTDATA_PATH, 'test_cart.p8'),
+                  encoding='utf-8') as fh:
+            src = fh.read()
+        src = src.replace('__lua__\n', '__lua__\nprint("\u2588 \u2665")\n', 1)
+        self.fname = os.path.join(self.tempdir.name, 'glyph.p8')
+        with open(self.fname, 'w', encoding='utf-8') as fh:
+            fh.write(src)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def run_tool(self, args):
+        # (A strict ASCII stream raises UnicodeEncodeError on any glyph.)
+        out = io.TextIOWrapper(io.BytesIO(), encoding='ascii',
+                               errors='strict')
+        with patch.object(util, '_write_stream', out):
+            self.assertEqual(0, tool.main(args))
+        out.flush()
+        return out.buffer.getvalue()
+
+    def testListLua(self):
+        self.assertIn(b'print("_ _")\n',
+                      self.run_tool(['listlua', self.fname]))
+
+    def testLuaFind(self):
+        self.assertIn(b':1:print("_ _")\n', self.run_tool(
+            ['luafind', 'print', self.fname]))
+
+    def testLuaFindGlyphPattern(self):
+        self.assertEqual(self.fname + ':1:print("_ _")\n', self.run_tool(
+            ['luafind', '\u2588 \u2665', self.fname]).decode('ascii'))
+
+    def testLuaFindPatternNotInP8SCII(self):
+        err = io.StringIO()
+        with patch.object(util, '_error_stream', err):
+            self.assertEqual(1, tool.main(
+                ['luafind', '\u4e2d', self.fname]))
+        self.assertIn('not in P8SCII', err.getvalue())
+
+
+class TestErrorMessages(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.bad_fname = os.path.join(self.tempdir.name, 'bad.p8')
+        with open(self.bad_fname, 'w', encoding='utf-8') as fh:
+            fh.write('pico-8 cartridge // http://www.pico-8.com\n'
+                     'version 8\n__lua__\nif then\n')
+        self.missing_fname = os.path.join(self.tempdir.name, 'missing.p8')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def testWriteP8Errors(self):
+        err = io.StringIO()
+        with patch.object(util, '_error_stream', err):
+            self.assertEqual(1, tool.main(
+                ['writep8', self.bad_fname, 'notes.txt',
+                 self.missing_fname]))
+        lines = err.getvalue().splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertEqual(
+            self.bad_fname + ": Expected b'end' at line 1 char 7", lines[0])
+        self.assertEqual('notes.txt: filename must end in .p8 or .p8.png',
+                         lines[1])
+        self.assertTrue(lines[2].startswith(self.missing_fname + ': '))
+        self.assertEqual(['bad.p8'], os.listdir(self.tempdir.name))
+
+
+class CountingStringIO(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.write_count = 0
+
+    def write(self, s):
+        self.write_count += 1
+        return super().write(s)
+
+
+class TestOneWritePerCart(unittest.TestCase):
+    def setUp(self):
+        self.fnames = [os.path.join(TESTDATA_PATH, 'test_gol.p8'),
+                       os.path.join(TESTDATA_PATH, 'test_cart.p8')]
+
+    def assertOneWritePerCart(self, args):
+        out = CountingStringIO()
+        with patch.object(util, '_write_stream', out):
+            self.assertEqual(0, tool.main(args + self.fnames))
+        self.assertEqual(len(self.fnames), out.write_count)
+        self.assertIn(os.path.basename(self.fnames[1]), out.getvalue())
+
+    def testListLua(self):
+        self.assertOneWritePerCart(['listlua'])
+
+    def testListLuaLineNumbers(self):
+        self.assertOneWritePerCart(['listlua', '--show-line-numbers'])
+
+    def testListTokens(self):
+        self.assertOneWritePerCart(['listtokens'])
+
+    def testPrintAst(self):
+        self.assertOneWritePerCart(['printast'])
+
+    def testStats(self):
+        self.assertOneWritePerCart(['stats'])
+
+    def testQuietWritesNothing(self):
+        out = CountingStringIO()
+        with patch.object(util, '_verbosity', util.VERBOSITY_NORMAL):
+            with patch.object(util, '_write_stream', out):
+                self.assertEqual(0, tool.main(
+                    ['-q', 'listlua'] + self.fnames))
+        self.assertEqual(0, out.write_count)
+
+
+class TestCartCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tempdir.name, 'picotool')
+        patcher = patch.dict(os.environ,
+                             {'XDG_CACHE_HOME': self.tempdir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tempdir.cleanup)
+        self.fname = os.path.join(TESTDATA_PATH, 'test_gol.p8')
+
+    def run_stats(self, args):
+        with patch.object(util, '_write_stream', io.StringIO()):
+            self.assertEqual(0, tool.main(args + ['stats', self.fname]))
+
+    def testCacheIsOffByDefault(self):
+        self.run_stats([])
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def testCacheFlag(self):
+        self.run_stats(['--cache'])
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+    def write_cart(self, name, lua_code):
+        fname = os.path.join(self.tempdir.name, name)
+        with open(fname, 'wb') as fh:
+            fh.write(b'pico-8 cartridge // http://www.pico-8.com\n'
+                     b'version 8\n__lua__\n' + lua_code)
+        return fname
+
+    def load(self, fname, parse=True):
+        """Loads a cart with the cache, counting loads from the file."""
+        with patch.object(tool.file, 'from_file',
+                          wraps=tool.file.from_file) as from_file:
+            g, msg, _ = tool._load_game(fname, parse=parse, use_cache=True)
+        self.assertIsNotNone(g, msg)
+        return g, from_file.call_count
+
+    def testHit(self):
+        fname = self.write_cart('hit.p8', b'-- hit\nprint("hi")\n')
+        g, loads = self.load(fname)
+        self.assertEqual(1, loads)
+
+        cwd = os.getcwd()
+        os.chdir(self.tempdir.name)
+        self.addCleanup(os.chdir, cwd)
+        cached, loads = self.load('hit.p8')
+        self.assertEqual(0, loads)
+        self.assertEqual('hit.p8', cached.filename)
+        self.assertEqual(list(g.lua.to_lines()), list(cached.lua.to_lines()))
+        self.assertEqual(g.lua.get_stats(), cached.lua.get_stats())
+        self.assertIsNotNone(cached.lua.root)
+        self.assertEqual(g.gfx._data, cached.gfx._data)
+
+    def testChangedMtimeIsMiss(self):
+        fname = self.write_cart('mtime.p8', b'x = 1\n')
+        self.load(fname)
+        st = os.stat(fname)
+        os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        _, loads = self.load(fname)
+        self.assertEqual(1, loads)
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+
+    def testChangedSizeIsMiss(self):
+        fname = self.write_cart('size.p8', b'x = 1\n')
+        self.load(fname)
+        st = os.stat(fname)
+        with open(fname, 'ab') as fh:
+            fh.write(b'y = 2\n')
+        # (Restore the mtime so that only the size differs.)
+        os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns))
+        g, loads = self.load(fname)
+        self.assertEqual(1, loads)
+        self.assertIn(b'y = 2', b''.join(g.lua.to_lines()))
+
+    def testCorruptEntryIsMiss(self):
+        fname = self.write_cart('corrupt.p8', b'x = 1\n')
+        self.load(fname)
+        cache_fname = tool._get_cache_filename(fname, True)
+        with open(cache_fname, 'wb') as fh:
+            fh.write(b'not a cache entry')
+        g, loads = self.load(fname)
+        self.assertEqual(1, loads)
+        self.assertEqual(b'x = 1\n', b''.join(g.lua.to_lines()))
+        # (The damaged entry is replaced.)
+        _, loads = self.load(fname)
+        self.assertEqual(0, loads)
+
+    def testIncludeIsNotCached(self):
+        with open(os.path.join(self.tempdir.name, 'lib.lua'), 'wb') as fh:
+            fh.write(b'y = 2\n')
+        fname = self.write_cart('include.p8', b'#include lib.lua\nx = 1\n')
+        self.load(fname)
+        self.assertFalse(os.path.exists(self.cache_dir))
+        _, loads = self.load(fname)
+        self.assertEqual(1, loads)
+
+    def testTokensOnlyUsesSeparateKey(self):
+        fname = self.write_cart('tokens.p8', b'x = 1\n')
+        g, _ = self.load(fname, parse=False)
+        self.assertIsNone(g.lua.root)
+        tokens_fname = tool._get_cache_filename(fname, False)
+        self.assertTrue(tokens_fname.endswith('.tokens.pkl'))
+        self.assertEqual(tokens_fname[:-len('.tokens.pkl')] + '.pkl',
+                         tool._get_cache_filename(fname, True))
+        self.assertEqual([os.path.basename(tokens_fname)],
+                         os.listdir(self.cache_dir))
+
+        g, loads = self.load(fname)
+        self.assertEqual(1, loads)
+        self.assertIsNotNone(g.lua.root)
+        _, loads = self.load(fname, parse=False)
+        self.assertEqual(0, loads)
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.fnames = [os.path.join(TESTDATA_PATH, 'test_gol.p8'),
+                       os.path.join(TESTDATA_PATH, 'test_cart.p8')]
+
+    def testStatsCSV(self):
+        with patch('sys.stdout', new_callable=CountingStringIO) as out:
+            self.assertEqual(0, tool.main(
+                ['stats', '--csv'] + self.fnames))
+        self.assertEqual(
+            'Filename,Title,Byline,Code Version,Char Count,Token Count,'
+            'Line Count,Compressed Code Size\r\n'
+            'test_gol.p8,game of life: v1,by dddaaannn,5,1219,348,63,501\r\n'
+            'test_cart.p8,,,8,18,3,2,20\r\n',
+            out.getvalue())
+        self.assertEqual(1, out.write_count)
+
+    def testStatsDoesNotParse(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            fname = os.path.join(tempdir, 'syntax_error.p8')
+            with open(fname, 'w', encoding='utf-8') as fh:
+                fh.write('pico-8 cartridge // http://www.pico-8.com\n'
+                         'version 8\n__lua__\n-- broken\nif then\n')
+            with patch('sys.stdout', new_callable=io.StringIO) as out:
+                self.assertEqual(0, tool.main(
+                    ['stats', '--csv', fname]))
+        self.assertEqual(
+            'syntax_error.p8,broken,,8,18,2,2,19\r\n',
+            out.getvalue().split('\r\n', 1)[1])
+
+    def testStatsCSVQuoting(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            fname = os.path.join(tempdir, 'quote.p8')
+            with open(fname, 'w', encoding='utf-8') as fh:
+                fh.write('pico-8 cartridge // http://www.pico-8.com\n'
+                         'version 8\n__lua__\n'
+                         '-- hello, "world"\n-- by a,b\n')
+            with patch('sys.stdout', new_callable=io.StringIO) as out:
+                self.assertEqual(0, tool.main(
+                    ['stats', '--csv', fname]))
+        self.assertEqual(
+            'quote.p8,"hello, ""world""","by a,b",8,28,0,2,31\r\n',
+            out.getvalue().split('\r\n', 1)[1])
+
+    def testStatsCSVBatches(self):
+        with patch('sys.stdout', new_callable=CountingStringIO) as out:
+            with patch.object(tool, '_STATS_CSV_BATCH_SIZE', 1):
+                self.assertEqual(0, tool.main(
+                    ['stats', '--csv'] + self.fnames))
+        self.assertEqual(3, out.getvalue().count('\r\n'))
+        self.assertEqual(2, out.write_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -71,6 +71,15 @@ class TestBaseSection(unittest.TestCase):
         self.assertEqual(b'abcdefgh', s._data)
         self.assertEqual(4, s._version)
 
+    def testFromLinesWhitespace(self):
+        lines = [b'616263 \r\n', b'646566\t\n', b'6768']
+        s = DummySection.from_lines(lines, 4)
+        self.assertEqual(b'abcdefgh', s._data)
+
+    def testFromLinesBadHex(self):
+        self.assertRaises(ValueError, DummySection.from_lines,
+                          [b'6162xx\n'], 4)
+
     def testFromBytes(self):
         s = DummySection.from_bytes(b'abcdefgh', 4)
         self.assertEqual(b'abcdefgh', s._data)